@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de páginas em paralelo.
+
+Extrai todos os PDFs da pasta com 1 processo e com cada número de workers pedido,
+sem o cache de extração, e confere que o resultado é idêntico ao sequencial.
+
+Uso:
+  python benchmark_extracao.py                      # workers 1, 2 e 4
+  python benchmark_extracao.py --workers 1 2 4 8
+  python benchmark_extracao.py --tabelas            # texto e tabelas (como extrair_todos.py)
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from extracao_paginas import CacheExtracao, extrair_paginas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da extração de páginas em paralelo")
+    parser.add_argument("--pasta", default=str(Path(__file__).resolve().parent), help="Pasta com os PDFs")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--tabelas", action="store_true", help="Extrair também as tabelas")
+    args = parser.parse_args()
+
+    pdfs = sorted(Path(args.pasta).glob("*.pdf"))
+    if not pdfs:
+        print(f"Nenhum PDF encontrado em: {args.pasta}", file=sys.stderr)
+        sys.exit(1)
+
+    sem_cache = CacheExtracao(max_bytes=0)
+    workers = sorted(set([1] + args.workers))
+    print(f"{len(pdfs)} PDF(s), {os.cpu_count()} CPU(s), tabelas={'sim' if args.tabelas else 'não'}")
+
+    referencia = None
+    base = None
+    for n in workers:
+        # Aquece o pool (criação dos processos não entra na medição)
+        extrair_paginas(str(pdfs[0]), tabelas=args.tabelas, cache=sem_cache, workers=n)
+        inicio = time.perf_counter()
+        resultados = [extrair_paginas(str(p), tabelas=args.tabelas, cache=sem_cache, workers=n) for p in pdfs]
+        duracao = time.perf_counter() - inicio
+        paginas = sum(len(r) for r in resultados)
+
+        if referencia is None:
+            referencia, base = resultados, duracao
+            conferido = "referência"
+        else:
+            conferido = "idêntico" if resultados == referencia else "DIFERENTE"
+        print(f"  workers={n:<3} {duracao:8.2f} s  {paginas / duracao:7.1f} pág/s  "
+              f"speedup {base / duracao:5.2f}x  {conferido}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Extração página a página de PDFs com cache em disco.
+
+O cache é endereçado pelo conteúdo: a chave é o sha256 do arquivo mais a versão do
+extrator (EXTRATOR_VERSAO e a versão do pdfplumber). Reenviar ou reprocessar um PDF já
+visto devolve o texto e as tabelas salvos, sem abrir o PDF.
+
+Configuração por variáveis de ambiente:
+  PDF_CACHE_DIR     pasta do cache (default: PDF/cache)
+  PDF_CACHE_MAX_MB  tamanho máximo em MB; ao passar, as entradas usadas há mais tempo
+                    são removidas (default: 200; 0 desativa o cache)
+  PDF_WORKERS       processos que extraem páginas em paralelo (default: 1, sem paralelismo)
+  PDF_MAX_RSS_MB    teto de memória (RSS) do processo durante a extração; ao passar, o PDF é
+                    reaberto para descartar os caches do pdfminer e, se ainda assim continuar
+                    acima, a extração é interrompida (default: 0, sem teto)
+
+As páginas são percorridas uma a uma e o cache de objetos de cada página é liberado assim
+que ela é processada, então a memória não cresce com o número de páginas.
+
+Com recorte (ex.: folha_ponto.RecorteFolhaPonto), só o texto de algumas faixas de cada página
+é extraído, a partir de um template localizado uma vez por layout de documento; as páginas em
+que o template não confere são lidas inteiras. Com classificador
+(classificacao_paginas.ClassificadorPaginas), o tipo de cada página é decidido pelos
+caracteres crus e só as páginas dos tipos relevantes têm o texto extraído.
+"""
+import gc
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+# Incrementar quando a forma de extrair o texto/tabelas mudar (invalida o cache)
+EXTRATOR_VERSAO = 1
+
+CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', Path(__file__).resolve().parent / 'cache'))
+CACHE_MAX_MB = float(os.environ.get('PDF_CACHE_MAX_MB', '200'))
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '1'))
+PDF_MAX_RSS_MB = float(os.environ.get('PDF_MAX_RSS_MB', '0'))
+# Intervalos menores que isso não compensam abrir o PDF em outro processo
+PAGINAS_POR_INTERVALO_MIN = 2
+
+_SUFIXO = '.json.gz'
+
+
+def sha256_arquivo(caminho, bloco=1024 * 1024):
+    """sha256 (hex) do conteúdo do arquivo"""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b''):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def versao_extrator():
+    """Versão que entra na chave do cache: a do extrator e a do pdfplumber"""
+    import pdfplumber
+    return f"v{EXTRATOR_VERSAO}-pdfplumber{pdfplumber.__version__}"
+
+
+class CacheExtracao:
+    """
+    Cache em disco das páginas extraídas, uma entrada (JSON gzip) por PDF/versão.
+
+    A gravação é atômica (arquivo temporário + os.replace), então vários processos podem
+    compartilhar a pasta. O mtime de cada entrada é atualizado a cada leitura e serve de
+    ordem LRU para a remoção quando o total passa de max_bytes.
+    """
+
+    def __init__(self, diretorio=CACHE_DIR, max_bytes=int(CACHE_MAX_MB * 1024 * 1024)):
+        self.diretorio = Path(diretorio)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self):
+        return self.max_bytes > 0
+
+    def _caminho(self, chave):
+        return self.diretorio / f"{chave}{_SUFIXO}"
+
+    def get(self, chave):
+        """Entrada salva para a chave, ou None"""
+        if not self.ativo:
+            return None
+        caminho = self._caminho(chave)
+        try:
+            with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+                entrada = json.load(f)
+            os.utime(caminho)  # Marca como usada recentemente (LRU)
+            return entrada
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError):
+            # Entrada corrompida (gravação interrompida, disco cheio): descarta
+            caminho.unlink(missing_ok=True)
+            return None
+
+    def put(self, chave, entrada):
+        """Grava a entrada e remove as menos usadas se o cache passar do limite"""
+        if not self.ativo:
+            return
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, prefix=f".{chave}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+                f.write(json.dumps(entrada, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp, self._caminho(chave))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entradas = []
+            total = 0
+            for caminho in self.diretorio.glob(f"*{_SUFIXO}"):
+                try:
+                    st = caminho.stat()
+                except FileNotFoundError:
+                    continue  # Removida por outro processo
+                entradas.append((st.st_mtime, st.st_size, caminho))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entradas.sort()
+            for _, tamanho, caminho in entradas:
+                if total <= self.max_bytes:
+                    break
+                caminho.unlink(missing_ok=True)
+                total -= tamanho
+
+
+_cache_padrao = None
+
+
+def cache_padrao():
+    """Cache compartilhado pelo app e pelos scripts, configurado pelas variáveis de ambiente"""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheExtracao()
+    return _cache_padrao
+
+
+_pool = None
+_pool_chave = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    # Reaproveitado entre chamadas; recriado após fork ou se o número de workers mudar
+    global _pool, _pool_chave
+    with _pool_lock:
+        chave = (os.getpid(), workers)
+        if _pool is None or _pool_chave != chave:
+            if _pool is not None and _pool_chave[0] == os.getpid():
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_chave = chave
+        return _pool
+
+
+def _descartar_pool():
+    global _pool, _pool_chave
+    with _pool_lock:
+        if _pool is not None and _pool_chave[0] == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = _pool_chave = None
+
+
+class LimiteMemoriaExcedido(MemoryError):
+    """A extração passou de PDF_MAX_RSS_MB mesmo após reabrir o PDF"""
+
+
+def rss_atual():
+    """Memória residente (RSS) do processo em bytes, ou None onde não dá para medir (fora do Linux)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def iterar_paginas_pdf(pdf_path, inicio=0, fim=None, max_rss_mb=None):
+    """
+    Gera (numero, total, page) para as páginas inicio..fim-1 (índices a partir de 0; fim=None
+    vai até a última), abrindo o PDF.
+
+    Quando o consumidor pede a próxima página, os objetos da anterior (chars, layout, textmap)
+    são descartados. max_rss_mb (default: PDF_MAX_RSS_MB; 0 desliga) é verificado após cada
+    página: acima dele o PDF é fechado e reaberto; se o RSS continuar acima, levanta
+    LimiteMemoriaExcedido.
+    """
+    import pdfplumber
+    limite = (PDF_MAX_RSS_MB if max_rss_mb is None else max_rss_mb) * 1024 * 1024
+    pdf = pdfplumber.open(pdf_path)
+    try:
+        total = len(pdf.pages)
+        fim = total if fim is None else min(fim, total)
+        for indice in range(inicio, fim):
+            page = pdf.pages[indice]
+            try:
+                yield indice + 1, total, page
+            finally:
+                page.flush_cache()
+                page.get_textmap.cache_clear()
+
+            if limite and indice + 1 < fim and (rss_atual() or 0) > limite:
+                pdf.close()
+                gc.collect()
+                if (rss_atual() or 0) > limite:
+                    raise LimiteMemoriaExcedido(
+                        f"Extração de {Path(pdf_path).name} passou de {limite / 1024 / 1024:.0f} MB "
+                        f"de memória na página {indice + 1}"
+                    )
+                pdf = pdfplumber.open(pdf_path)
+    finally:
+        pdf.close()
+
+
+def _iterar_chars(objetos):
+    from pdfminer.layout import LTChar, LTContainer
+    for obj in objetos:
+        if isinstance(obj, LTChar):
+            yield obj
+        elif isinstance(obj, LTContainer):
+            yield from _iterar_chars(obj)
+
+
+def texto_faixas(page, faixas):
+    """
+    Texto de faixas horizontais da página, cada uma (top, bottom) em pontos a partir do topo.
+
+    Os caracteres são lidos direto do layout do pdfminer: só os que ficam inteiros dentro de
+    uma faixa viram dicts para o pdfplumber montar o texto, em vez de todos os objetos da
+    página (page.chars), que é a maior parte do custo de extract_text().
+    Retorna (textos, bruto): o texto de cada faixa, igual ao de
+    page.within_bbox((x0, top, x1, bottom)).extract_text() na largura toda, e os caracteres
+    da página inteira na ordem do conteúdo, para conferir se algo ficou fora das faixas.
+    """
+    from pdfplumber.utils import chars_to_textmap
+    altura = page.height
+    selecionados = [[] for _ in faixas]
+    bruto = []
+    for char in _iterar_chars(page.layout):
+        texto = char.get_text()
+        bruto.append(texto)
+        top, bottom = altura - char.y1, altura - char.y0
+        for indice, (inicio, fim) in enumerate(faixas):
+            if top >= inicio and bottom <= fim:
+                selecionados[indice].append({
+                    "text": texto, "x0": char.x0, "x1": char.x1, "top": top, "bottom": bottom,
+                    "doctop": top, "upright": char.upright, "width": char.width,
+                    "height": char.height, "fontname": char.fontname, "size": char.size,
+                })
+                break
+    textos = [chars_to_textmap(chars).as_string if chars else "" for chars in selecionados]
+    return textos, "".join(bruto)
+
+
+def amostra_pagina(page):
+    """Caracteres da página na ordem do conteúdo, sem espaços: amostra barata para classificar a página"""
+    return "".join("".join(char.get_text() for char in _iterar_chars(page.layout)).split())
+
+
+def _texto_recortado(page, recorte, template):
+    """
+    (texto, template, recortada) da página: o texto das faixas do template quando ele confere;
+    senão a página inteira e, se ela for do tipo esperado, o template localizado nela para as
+    próximas páginas.
+    """
+    if template is not None:
+        texto = recorte.extrair(page, template)
+        if texto is not None:
+            return texto, template, True
+    texto = page.extract_text() or ""
+    if recorte.reconhece(texto):
+        template = recorte.localizar(page) or template
+    return texto, template, False
+
+
+def contar_paginas(pdf_path):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _extrair_intervalo(pdf_path, inicio, fim, tabelas, textos=None, progresso=None, recorte=None,
+                       classificador=None, tipos=None, com_amostra=False, texto=True):
+    """
+    Extrai as páginas inicio..fim-1 (índices a partir de 0; fim=None até a última).
+    texto: False para não extrair o texto ("texto" fica None).
+    textos: textos já conhecidos dessas páginas (só as tabelas são extraídas).
+    tipos: tipos já conhecidos dessas páginas (não são classificadas de novo).
+    com_amostra: guarda a amostra de cada página em "amostra", para _reclassificar().
+    """
+    paginas = []
+    template = None
+    contexto = {}
+    for numero, total, page in iterar_paginas_pdf(pdf_path, inicio, fim):
+        pagina = {"numero": numero}
+        relevante = True
+        if tipos is not None:
+            pagina["tipo"] = tipos[numero - 1 - inicio]
+            relevante = pagina["tipo"] in classificador.relevantes
+        elif classificador is not None:
+            amostra = amostra_pagina(page)
+            pagina["tipo"] = classificador.classificar(amostra, contexto)
+            relevante = pagina["tipo"] in classificador.relevantes
+            if com_amostra:
+                pagina["amostra"] = amostra
+        if not texto:
+            pagina["texto"] = None
+        elif not relevante:
+            pagina["texto"] = ""
+        elif textos is not None:
+            pagina["texto"] = textos[numero - 1 - inicio]
+        elif recorte is not None:
+            pagina["texto"], template, pagina["recortada"] = _texto_recortado(page, recorte, template)
+        else:
+            pagina["texto"] = page.extract_text() or ""
+        if tabelas:
+            pagina["tabelas"] = page.extract_tables() if relevante else []
+        else:
+            pagina["tabelas"] = None
+        paginas.append(pagina)
+        if progresso:
+            progresso(numero, total)
+    return paginas
+
+
+def _intervalos(total, workers):
+    """Divide as páginas em intervalos contíguos (até 4 por worker, para equilibrar a carga)"""
+    tamanho = max(PAGINAS_POR_INTERVALO_MIN, -(-total // (workers * 4)))
+    return [(inicio, min(inicio + tamanho, total)) for inicio in range(0, total, tamanho)]
+
+
+def _extrair_paralelo(pdf_path, total, workers, tabelas, textos, progresso, recorte, classificador, texto):
+    pool = _get_pool(workers)
+    futures = {
+        pool.submit(_extrair_intervalo, pdf_path, inicio, fim, tabelas,
+                    textos[inicio:fim] if textos is not None else None, None, recorte, classificador,
+                    None, classificador is not None, texto): inicio
+        for inicio, fim in _intervalos(total, workers)
+    }
+    partes = {}
+    concluidas = 0
+    try:
+        for future in as_completed(futures):
+            partes[futures[future]] = future.result()
+            concluidas += len(partes[futures[future]])
+            if progresso:
+                progresso(concluidas, total)
+    except BrokenProcessPool:
+        # Um worker morreu (ex.: falta de memória): o próximo uso cria outro pool
+        _descartar_pool()
+        raise
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    # Junta na ordem das páginas
+    paginas = [pagina for inicio in sorted(partes) for pagina in partes[inicio]]
+    if classificador is not None:
+        _reclassificar(pdf_path, paginas, tabelas, textos, recorte, classificador, texto)
+    return paginas
+
+
+def _reclassificar(pdf_path, paginas, tabelas, textos, recorte, classificador, texto):
+    """
+    Refaz a classificação das páginas em sequência, com um só contexto para o PDF inteiro.
+
+    Cada intervalo da extração paralela começa com o contexto vazio, mas o tipo de uma página
+    pode depender das anteriores (continuação da totalização da folha). A partir das amostras
+    guardadas pelos workers, as páginas que passam a ser relevantes são extraídas de novo e as
+    que deixam de ser ficam sem texto, como na extração sequencial.
+    """
+    contexto = {}
+    for indice, pagina in enumerate(paginas):
+        tipo = classificador.classificar(pagina.pop("amostra"), contexto)
+        if tipo == pagina["tipo"]:
+            continue
+        if tipo in classificador.relevantes and pagina["tipo"] not in classificador.relevantes:
+            inicio = pagina["numero"] - 1
+            (paginas[indice],) = _extrair_intervalo(
+                pdf_path, inicio, inicio + 1, tabelas, textos[inicio:inicio + 1] if textos is not None else None,
+                None, recorte, classificador, [tipo], False, texto)
+            continue
+        pagina["tipo"] = tipo
+        if tipo not in classificador.relevantes:
+            pagina["texto"] = "" if texto else None
+            pagina.pop("recortada", None)
+            if tabelas:
+                pagina["tabelas"] = []
+
+
+def _chave_cache(pdf_path):
+    return f"{sha256_arquivo(pdf_path)}-{versao_extrator()}"
+
+
+def iterar_tabelas_paginas(pdf_path, cache=None):
+    """
+    Gera (numero, tabelas) de cada página sob demanda: as tabelas de uma página só são
+    extraídas quando o consumidor pede por ela (parar a iteração evita o custo das demais).
+    Quando o PDF já está no cache com tabelas, elas vêm de lá.
+    """
+    cache = cache_padrao() if cache is None else cache
+    entrada = cache.get(_chave_cache(pdf_path)) if cache.ativo else None
+    if entrada is not None and entrada['tabelas']:
+        for pagina in entrada['paginas']:
+            yield pagina['numero'], pagina['tabelas']
+        return
+    for numero, _, page in iterar_paginas_pdf(pdf_path):
+        yield numero, page.extract_tables()
+
+
+def extrair_paginas(pdf_path, tabelas=False, progresso=None, cache=None, workers=None, recorte=None,
+                    classificador=None, texto=True):
+    """
+    Texto (e, com tabelas=True, as tabelas) de cada página do PDF.
+
+    Retorna uma lista de {"numero", "texto", "tabelas"} na ordem das páginas; "texto" é ""
+    quando a página não tem texto e "tabelas" é None quando não foram pedidas.
+    texto: False para só as tabelas, sem o custo de extract_text(); "texto" fica None.
+    progresso(paginas_prontas, total), se informado, é chamado conforme as páginas são
+    extraídas (num acerto do cache, uma única vez com o total).
+    workers: processos para extrair em paralelo (default: PDF_WORKERS); com 1, ou com
+    poucas páginas, a extração é feita no próprio processo.
+    recorte: extrai só as faixas de interesse de cada página. Objeto com nome (entra na chave
+    do cache), reconhece(texto), localizar(page) -> template ou None e
+    extrair(page, template) -> texto ou None (quando o template não confere). Cada página
+    ganha "recortada" (False quando foi lida inteira).
+    classificador: objeto com nome, relevantes (tipos a extrair) e classificar(amostra, contexto)
+    -> tipo, chamado com amostra_pagina() de cada página, em ordem, e um único dict de contexto
+    para o PDF (também com workers > 1). Cada página ganha "tipo"; as de tipos fora de
+    relevantes ficam com texto "".
+    """
+    cache = cache_padrao() if cache is None else cache
+    workers = PDF_WORKERS if workers is None else workers
+    chave = _chave_cache(pdf_path) if cache.ativo else None
+    if chave and recorte is not None:
+        chave = f"{chave}-{recorte.nome}"
+    if chave and classificador is not None:
+        chave = f"{chave}-{classificador.nome}"
+    if chave and not texto:
+        chave = f"{chave}-sem-texto"
+
+    entrada = cache.get(chave) if chave else None
+    if entrada is not None and (not tabelas or entrada['tabelas']):
+        paginas = entrada['paginas']
+        if progresso and paginas:
+            progresso(len(paginas), len(paginas))
+        return paginas
+
+    # Entrada salva só com texto e agora as tabelas foram pedidas: reaproveita os textos
+    textos = [p['texto'] for p in entrada['paginas']] if entrada is not None else None
+
+    total = contar_paginas(pdf_path) if workers > 1 else 0
+    if total >= 2 * PAGINAS_POR_INTERVALO_MIN:
+        paginas = _extrair_paralelo(pdf_path, total, workers, tabelas, textos, progresso, recorte, classificador,
+                                    texto)
+    else:
+        paginas = _extrair_intervalo(pdf_path, 0, None, tabelas, textos, progresso, recorte, classificador,
+                                     texto=texto)
+
+    if chave:
+        cache.put(chave, {"versao": versao_extrator(), "tabelas": tabelas, "paginas": paginas})
+    return paginas
@@ -6,15 +6,34 @@ Uso:
   python extrair_todos.py              # processa a pasta atual
   python extrair_todos.py --pasta .    # mesmo
   python extrair_todos.py --pasta /caminho/para/pdfs
+  python extrair_todos.py --jobs 4     # 4 PDFs ao mesmo tempo, em processos separados
+  python extrair_todos.py --forcar     # reprocessa também os PDFs que não mudaram
+  python extrair_todos.py --modo completo  # inclui as tabelas no JSON (default: só o texto)
+
+A pasta de saída guarda um manifesto (manifest.json) com o sha256 de cada PDF, a versão do
+extrator e o modo usados: numa nova execução, os PDFs inalterados cujas saídas existem são pulados.
+JSON, CSV e manifesto são gravados num arquivo temporário e renomeados, então uma execução
+interrompida nunca deixa arquivo pela metade em extraidos/.
 """
 
 import argparse
+import csv
 import json
+import os
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 # Importa o extrator existente
-from extrator_folha_adiantamento import extrair_com_pdfplumber
+from extracao_paginas import sha256_arquivo, versao_extrator
+from extrator_folha_adiantamento import MODO_TEXTO, MODOS, extrair_com_pdfplumber, iterar_tabelas
+
+MANIFESTO = "manifest.json"
+
+# mkstemp cria o arquivo só para o dono; as saídas ficam com as permissões de um open() comum
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 
 
 def nome_saida(nome_pdf: str, sufixo: str = "json") -> str:
@@ -25,6 +44,65 @@ def nome_saida(nome_pdf: str, sufixo: str = "json") -> str:
     return f"{seguro}.{sufixo}"
 
 
+def gravar_atomico(caminho: Path, escrever, newline=None) -> None:
+    """Grava via arquivo temporário na mesma pasta + os.replace: o destino fica inteiro ou intocado."""
+    fd, tmp = tempfile.mkstemp(dir=caminho.parent, prefix=f".{caminho.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline=newline) as f:
+            escrever(f)
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, caminho)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def carregar_manifesto(pasta_saida: Path) -> dict:
+    """{nome do PDF: {"sha256", "versao", "modo", "csv", "saidas"}} da última execução ({} se não houver)."""
+    try:
+        with open(pasta_saida / MANIFESTO, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def inalterado(entrada: dict, sha256: str, versao: str, modo: str, gerar_csv: bool, pasta_saida: Path) -> bool:
+    """PDF, extrator e modo iguais aos da última execução, CSV já pedido (se for o caso) e as saídas ainda existem."""
+    return (
+        entrada is not None
+        and entrada.get("sha256") == sha256
+        and entrada.get("versao") == versao
+        and entrada.get("modo") == modo
+        and (entrada.get("csv") or not gerar_csv)
+        and all((pasta_saida / s).exists() for s in entrada.get("saidas", []))
+    )
+
+
+def processar_pdf(path_pdf: str, pasta_saida: str, gerar_csv: bool, workers: int = None,
+                  modo: str = MODO_TEXTO) -> list:
+    """Extrai um PDF e grava JSON (e CSV). Roda num processo do pool com --jobs; retorna as saídas geradas."""
+    nome = Path(path_pdf).name
+    pasta_saida = Path(pasta_saida)
+    dados = extrair_com_pdfplumber(path_pdf, workers=workers, modo=modo)
+
+    # JSON
+    arq_json = pasta_saida / nome_saida(nome, "json")
+    gravar_atomico(arq_json, lambda f: json.dump(dados, f, ensure_ascii=False, indent=2))
+    saidas = [arq_json.name]
+
+    # CSV (primeira tabela; no modo texto extraída sob demanda, só até a página em que aparece)
+    primeira = None
+    if gerar_csv:
+        primeira = dados["tabelas"][0] if dados["tabelas"] else None
+        if primeira is None and modo == MODO_TEXTO:
+            primeira = next(iterar_tabelas(path_pdf), None)
+    if primeira:
+        arq_csv = pasta_saida / nome_saida(nome, "csv")
+        gravar_atomico(arq_csv, lambda f: csv.writer(f, delimiter=";").writerows(primeira["dados"]), newline="")
+        saidas.append(arq_csv.name)
+    return saidas
+
+
 def main():
     parser = argparse.ArgumentParser(description="Extrai dados de todos os PDFs de uma pasta")
     parser.add_argument(
@@ -38,6 +116,11 @@ def main():
         help="Pasta onde salvar JSON/CSV (default: extraidos)",
     )
     parser.add_argument("--csv", action="store_true", help="Gerar também arquivo CSV por PDF")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="PDFs processados ao mesmo tempo, cada um num processo (default: 1)")
+    parser.add_argument("--forcar", action="store_true", help="Reprocessar mesmo os PDFs que não mudaram")
+    parser.add_argument("--modo", choices=MODOS, default=MODO_TEXTO,
+                        help="texto (o que a importação usa), tabelas ou completo (default: texto)")
     parser.add_argument("-q", "--quiet", action="store_true", help="Menos mensagens")
     args = parser.parse_args()
 
@@ -57,45 +140,70 @@ def main():
     if not args.quiet:
         print(f"Encontrados {len(pdfs)} PDF(s). Saída em: {pasta_saida.absolute()}\n")
 
-    erros = []
-    for i, path_pdf in enumerate(pdfs, 1):
-        nome = path_pdf.name
-        if not args.quiet:
-            print(f"[{i}/{len(pdfs)}] {nome} ...", end=" ", flush=True)
-        try:
-            dados = extrair_com_pdfplumber(str(path_pdf))
-
-            # JSON
-            arq_json = pasta_saida / nome_saida(nome, "json")
-            with open(arq_json, "w", encoding="utf-8") as f:
-                json.dump(dados, f, ensure_ascii=False, indent=2)
-            if not args.quiet:
-                print(f"JSON ok", end="")
-
-            # CSV (primeira tabela)
-            if args.csv and dados.get("tabelas"):
-                import csv
-                arq_csv = pasta_saida / nome_saida(nome, "csv")
-                with open(arq_csv, "w", encoding="utf-8", newline="") as f:
-                    w = csv.writer(f, delimiter=";")
-                    w.writerows(dados["tabelas"][0]["dados"])
-                if not args.quiet:
-                    print(f", CSV ok", end="")
+    # Só os PDFs novos ou alterados (ou extraídos por outra versão do extrator) são processados
+    versao = versao_extrator()
+    manifesto_anterior = carregar_manifesto(pasta_saida)
+    manifesto = {}
+    pendentes = []
+    for path_pdf in pdfs:
+        sha256 = sha256_arquivo(path_pdf)
+        entrada = manifesto_anterior.get(path_pdf.name)
+        if not args.forcar and inalterado(entrada, sha256, versao, args.modo, args.csv, pasta_saida):
+            manifesto[path_pdf.name] = entrada
+        else:
+            pendentes.append((path_pdf, sha256))
+    pulados = len(pdfs) - len(pendentes)
+    if pulados and not args.quiet:
+        print(f"{pulados} PDF(s) inalterado(s) desde a última execução, pulado(s).")
+
+    def gravar_manifesto():
+        gravar_atomico(pasta_saida / MANIFESTO,
+                       lambda f: json.dump(manifesto, f, ensure_ascii=False, indent=2, sort_keys=True))
 
-            if not args.quiet:
-                print()
+    erros = []
 
-        except Exception as e:
-            erros.append((nome, str(e)))
+    def concluir(i, path_pdf, sha256, saidas=None, erro=None):
+        nome = path_pdf.name
+        if erro is not None:
+            erros.append((nome, str(erro)))
             if not args.quiet:
-                print(f"ERRO: {e}")
+                print(f"[{i}/{len(pendentes)}] {nome} ... ERRO: {erro}")
+            return
+        # Manifesto regravado a cada PDF: uma execução interrompida não perde o que já terminou
+        manifesto[nome] = {"sha256": sha256, "versao": versao, "modo": args.modo, "csv": args.csv, "saidas": saidas}
+        gravar_manifesto()
+        if not args.quiet:
+            print(f"[{i}/{len(pendentes)}] {nome} ... " + ", ".join(f"{Path(s).suffix[1:].upper()} ok" for s in saidas))
+
+    if args.jobs > 1 and len(pendentes) > 1:
+        # Um PDF por processo; as páginas de cada um são extraídas no próprio processo do pool
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {
+                pool.submit(processar_pdf, str(path_pdf), str(pasta_saida), args.csv, 1, args.modo): (path_pdf, sha256)
+                for path_pdf, sha256 in pendentes
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                path_pdf, sha256 = futures[future]
+                try:
+                    concluir(i, path_pdf, sha256, saidas=future.result())
+                except Exception as e:
+                    concluir(i, path_pdf, sha256, erro=e)
+    else:
+        for i, (path_pdf, sha256) in enumerate(pendentes, 1):
+            try:
+                saidas = processar_pdf(str(path_pdf), str(pasta_saida), args.csv, modo=args.modo)
+            except Exception as e:
+                concluir(i, path_pdf, sha256, erro=e)
+            else:
+                concluir(i, path_pdf, sha256, saidas=saidas)
+    gravar_manifesto()  # Também remove do manifesto os PDFs que saíram da pasta
 
     if erros:
         print(f"\n{len(erros)} arquivo(s) com erro:", file=sys.stderr)
         for nome, msg in erros:
             print(f"  - {nome}: {msg}", file=sys.stderr)
     elif not args.quiet:
-        print(f"\nConcluído. {len(pdfs)} arquivo(s) processado(s).")
+        print(f"\nConcluído. {len(pendentes)} arquivo(s) processado(s), {pulados} inalterado(s).")
 
 
 if __name__ == "__main__":
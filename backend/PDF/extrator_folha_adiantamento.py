@@ -7,19 +7,61 @@ Uso:
   python extrator_folha_adiantamento.py <caminho_do.pdf>
   python extrator_folha_adiantamento.py <caminho_do.pdf> --json saida.json
   python extrator_folha_adiantamento.py <caminho_do.pdf> --csv saida.csv
+  python extrator_folha_adiantamento.py <caminho_do.pdf> --workers 4
+  python extrator_folha_adiantamento.py <caminho_do.pdf> --modo texto
+
+Modos de extração:
+  texto     só o texto das páginas (o que a importação para o banco usa); bem mais rápido
+  tabelas   só as tabelas
+  completo  texto e tabelas (default)
 """
 
 import argparse
 import json
 import re
 import sys
+from itertools import islice
 from pathlib import Path
 
+from extracao_paginas import extrair_paginas, iterar_tabelas_paginas
+
+MODO_TEXTO = "texto"
+MODO_TABELAS = "tabelas"
+MODO_COMPLETO = "completo"
+MODOS = (MODO_TEXTO, MODO_TABELAS, MODO_COMPLETO)
+
+# Valores em reais (R$ 1.234,56 ou 1.234,56). O prefixo "R$ " não entra no valor capturado,
+# então basta o número; o resumo guarda só os primeiros
+_RE_VALOR = re.compile(r"[\d.]{1,10},\d{2}")
+MAX_VALORES_RESUMO = 50
+
+
+def _tabela_com_dados(tabela) -> bool:
+    return bool(tabela) and any(cell for row in tabela for cell in (row or []) if cell)
 
-def extrair_com_pdfplumber(pdf_path: str) -> dict:
-    """Extrai todo o texto e tabelas do PDF usando pdfplumber."""
+
+def iterar_tabelas(pdf_path: str):
+    """
+    Tabelas não vazias do PDF ({"pagina", "dados"}), extraídas página a página conforme são
+    consumidas: next(iterar_tabelas(pdf)) só processa as páginas até a primeira tabela.
+    """
+    for numero, tabelas in iterar_tabelas_paginas(pdf_path):
+        for t in tabelas:
+            if _tabela_com_dados(t):
+                yield {"pagina": numero, "dados": t}
+
+
+def extrair_com_pdfplumber(pdf_path: str, workers: int = None, modo: str = MODO_COMPLETO) -> dict:
+    """
+    Extrai o texto e as tabelas do PDF usando pdfplumber (com cache por conteúdo do arquivo).
+    workers: processos para extrair as páginas em paralelo (default: variável PDF_WORKERS).
+    modo: MODO_TEXTO (sem tabelas; para as tabelas sob demanda, use iterar_tabelas()),
+    MODO_TABELAS (sem o texto das páginas) ou MODO_COMPLETO.
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo de extração inválido: {modo} (use {', '.join(MODOS)})")
     try:
-        import pdfplumber
+        import pdfplumber  # noqa: F401
     except ImportError:
         print("Erro: instale pdfplumber com: pip install pdfplumber", file=sys.stderr)
         sys.exit(1)
@@ -36,24 +78,27 @@ def extrair_com_pdfplumber(pdf_path: str) -> dict:
         "resumo": {},
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
-        resultado["total_paginas"] = len(pdf.pages)
-
-        for num, page in enumerate(pdf.pages, 1):
-            # Texto da página
-            text = page.extract_text()
-            if text:
-                resultado["texto_completo"] += f"\n--- Página {num} ---\n{text}"
-                resultado["paginas"].append({"numero": num, "texto": text})
-            else:
-                resultado["paginas"].append({"numero": num, "texto": ""})
-
-            # Tabelas da página
-            tables = page.extract_tables()
-            for t in tables:
-                if t and any(cell for row in t for cell in (row or []) if cell):
+    # Páginas vêm do cache de extração quando o mesmo PDF já foi processado
+    paginas = extrair_paginas(pdf_path, tabelas=modo != MODO_TEXTO, texto=modo != MODO_TABELAS, workers=workers)
+    resultado["total_paginas"] = len(paginas)
+
+    for pagina in paginas:
+        num, text = pagina["numero"], pagina["texto"]
+        # Texto da página
+        if modo != MODO_TABELAS:
+            resultado["paginas"].append({"numero": num, "texto": text})
+
+        # Tabelas da página
+        if modo != MODO_TEXTO:
+            for t in pagina["tabelas"]:
+                if _tabela_com_dados(t):
                     resultado["tabelas"].append({"pagina": num, "dados": t})
 
+    # Texto completo montado numa única junção (sem concatenar página a página)
+    if modo != MODO_TABELAS:
+        resultado["texto_completo"] = "".join(
+            f"\n--- Página {p['numero']} ---\n{p['texto']}" for p in paginas if p["texto"]
+        )
     resultado["resumo"] = _extrair_resumo(resultado["texto_completo"], resultado["tabelas"])
     return resultado
 
@@ -69,10 +114,10 @@ def _extrair_resumo(texto: str, tabelas: list) -> dict:
         resumo["mes"] = mes
         resumo["ano"] = "20" + ano if int(ano) < 100 else ano
 
-    # Valores em reais (padrão R$ 1.234,56 ou 1.234,56)
-    valores = re.findall(r"R?\$?\s*([\d.]{1,10},\d{2})", texto)
+    # Valores em reais: a busca para nos primeiros MAX_VALORES_RESUMO
+    valores = [m.group() for m in islice(_RE_VALOR.finditer(texto), MAX_VALORES_RESUMO)]
     if valores:
-        resumo["valores_encontrados"] = [v.strip() for v in valores[:50]]
+        resumo["valores_encontrados"] = valores
 
     # Números que parecem totais (linhas com "total" por perto)
     linhas = texto.lower().split("\n")
@@ -100,6 +145,10 @@ def main():
     parser.add_argument("--json", metavar="ARQUIVO", help="Salvar resultado em JSON")
     parser.add_argument("--csv", metavar="ARQUIVO", help="Salvar tabelas em CSV (primeira tabela)")
     parser.add_argument("-q", "--quiet", action="store_true", help="Não imprimir texto na tela")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos para extrair as páginas em paralelo (default: PDF_WORKERS ou 1)")
+    parser.add_argument("--modo", choices=MODOS, default=MODO_COMPLETO,
+                        help="texto, tabelas ou completo (default: completo)")
     args = parser.parse_args()
 
     pdf_path = args.pdf
@@ -108,16 +157,20 @@ def main():
         sys.exit(1)
 
     print(f"Processando: {pdf_path}", file=sys.stderr)
-    dados = extrair_com_pdfplumber(pdf_path)
+    dados = extrair_com_pdfplumber(pdf_path, workers=args.workers, modo=args.modo)
 
     if args.json:
         with open(args.json, "w", encoding="utf-8") as f:
             json.dump(dados, f, ensure_ascii=False, indent=2)
         print(f"JSON salvo em: {args.json}", file=sys.stderr)
 
-    if args.csv and dados["tabelas"]:
+    # No modo texto a primeira tabela é extraída sob demanda, sem processar as páginas seguintes
+    primeira = dados["tabelas"][0] if dados["tabelas"] else None
+    if args.csv and primeira is None and args.modo == MODO_TEXTO:
+        primeira = next(iterar_tabelas(pdf_path), None)
+    if args.csv and primeira:
         import csv
-        tabela = dados["tabelas"][0]["dados"]
+        tabela = primeira["dados"]
         with open(args.csv, "w", encoding="utf-8", newline="") as f:
             w = csv.writer(f, delimiter=";")
             w.writerows(tabela)
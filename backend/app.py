@@ -1,7 +1,7 @@
 """
 Backend Flask para API da Altus Engenharia
 """
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import os
@@ -11,6 +11,21 @@ import re
 from datetime import datetime
 import secrets
 import hashlib
+import threading
+import atexit
+import logging
+from migrations import (
+    apply_migrations, quote_identifier, natural_key_where, natural_key_upsert_sql,
+    TABLE_VERSIONS_TABLE, FILTER_FACETS_TABLE, INTERNAL_TABLES, NATURAL_KEYS,
+)
+from periodo import COLUNAS_PERIODO, MESES, resolver_colunas_periodo, normalizar_mes
+from serializer import RowSerializer, dumps as json_dumps
+from jobs import JobRunner, JobError
+from folha_iob import extrair_funcionarios
+from folha_ponto import RecorteFolhaPonto, ler_pagina
+from classificacao_paginas import FUNCIONARIO, OUTRA, PONTO, ClassificadorPaginas, contar_tipos
+from instrumentation import LOG_PDF_TEXT, StageTimer, configure_logging, format_fields
+from PDF.extracao_paginas import extrair_paginas
 try:
     import pdfplumber
     PDF_AVAILABLE = True
@@ -18,6 +33,9 @@ except ImportError:
     PDF_AVAILABLE = False
     print("⚠️  pdfplumber não instalado. Instale com: pip install pdfplumber")
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 # CORS configurado para aceitar requisições de qualquer origem (produção)
 # Para desenvolvimento, pode restringir aos domínios específicos
@@ -51,32 +69,112 @@ if not DB_FILE.exists():
             if pythonanywhere_path.exists():
                 DB_FILE = pythonanywhere_path
 
-def get_db_connection():
-    """Cria conexão com o banco de dados SQLite"""
+# Conexões SQLite: uma por thread, reutilizada entre requisições.
+# WAL permite leituras do dashboard em paralelo com o upload que está gravando.
+# Em sistemas de arquivos de rede sem suporte a WAL, use SQLITE_JOURNAL_MODE=DELETE.
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+
+_db_local = threading.local()
+_db_connections = {}  # thread -> conexão, para fechar as conexões de threads encerradas
+_db_connections_lock = threading.Lock()
+
+def _open_db_connection():
+    """Abre e configura uma nova conexão com o banco de dados SQLite"""
     try:
-        conn = sqlite3.connect(str(DB_FILE))
+        # check_same_thread=False apenas para permitir o fechamento no atexit;
+        # cada conexão continua sendo usada por uma única thread
+        conn = sqlite3.connect(str(DB_FILE), timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
         conn.row_factory = sqlite3.Row  # Permite acessar colunas por nome
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        if SQLITE_JOURNAL_MODE.upper() == 'WAL':
+            conn.execute("PRAGMA synchronous = NORMAL")  # Seguro com WAL e evita fsync a cada commit
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
         return conn
     except sqlite3.Error as e:
         print(f"Erro ao conectar ao banco de dados: {e}")
         print(f"Caminho tentado: {DB_FILE}")
         raise
 
+def get_db_connection():
+    """Retorna a conexão SQLite da thread atual, abrindo uma nova se necessário"""
+    conn = getattr(_db_local, "conn", None)
+    # Conexões nunca atravessam um fork (workers do uWSGI/gunicorn)
+    if conn is None or getattr(_db_local, "pid", None) != os.getpid():
+        conn = _open_db_connection()
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+        with _db_connections_lock:
+            _prune_db_connections()
+            _db_connections[threading.current_thread()] = conn
+    return conn
+
+def _prune_db_connections():
+    """Fecha as conexões de threads que já terminaram (ex.: servidor de desenvolvimento com uma thread por requisição)"""
+    for thread in [t for t in _db_connections if not t.is_alive()]:
+        try:
+            _db_connections.pop(thread).close()
+        except sqlite3.Error:
+            pass
+
+def close_db_connection():
+    """Fecha a conexão da thread atual (a próxima chamada a get_db_connection abre outra)"""
+    conn = getattr(_db_local, "conn", None)
+    _db_local.conn = None
+    if conn is not None and getattr(_db_local, "pid", None) == os.getpid():
+        with _db_connections_lock:
+            _db_connections.pop(threading.current_thread(), None)
+        conn.close()
+
+@atexit.register
+def close_all_db_connections():
+    """Fecha todas as conexões abertas pelo processo"""
+    with _db_connections_lock:
+        connections = list(_db_connections.values())
+        _db_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """Ao final de cada requisição, desfaz qualquer transação deixada aberta (ex.: erro no meio de uma escrita)"""
+    conn = getattr(_db_local, "conn", None)
+    if conn is None or getattr(_db_local, "pid", None) != os.getpid():
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.ProgrammingError:
+        pass  # Conexão já fechada (ex.: encerramento do processo)
+
+def init_schema():
+    """
+    Aplica as migrações de schema (tabelas, colunas de período, índices e triggers).
+    Uma falha interrompe a inicialização: sem o schema as rotas falhariam longe da causa.
+    """
+    try:
+        conn = get_db_connection()
+        apply_migrations(conn)
+    except Exception:
+        logger.exception("init_schema: falha ao aplicar as migrações em %s", DB_FILE)
+        raise
+    finally:
+        close_db_connection()
+
+init_schema()
+
 def init_auth_table():
-    """Inicializa a tabela de usuários e cria usuário padrão se não existir"""
+    """Cria os usuários padrão se não existirem (a tabela usuarios vem das migrações)"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                senha_hash TEXT NOT NULL,
-                nome TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'admin',
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
         cursor.execute("SELECT COUNT(*) FROM usuarios WHERE email = ?", ("admin@altus.com",))
         if cursor.fetchone()[0] == 0:
             senha_hash = hashlib.sha256("admin123".encode()).hexdigest()
@@ -90,30 +188,268 @@ def init_auth_table():
                 ("gestor@altus.com", senha_gestor, "Gestor", "gestor")
             )
         conn.commit()
-        conn.close()
     except Exception as e:
         print(f"⚠️ init_auth_table: {e}")
+    finally:
+        close_db_connection()
 
 init_auth_table()
 
+# Paginação por cursor (keyset) e streaming das linhas
+MAX_PAGE_LIMIT = 5000  # Máximo de registros por página quando ?limit= é usado
+STREAM_BATCH_SIZE = 500  # Linhas lidas do cursor por vez durante o streaming
+
+# Cache de metadados do schema, compartilhado pelo processo inteiro.
+# Guarda colunas, tipos e as colunas de mês/ano de cada tabela, e é descartado
+# sempre que PRAGMA schema_version muda (CREATE/ALTER/DROP em qualquer conexão).
+_schema_cache = {"version": None, "tables": None, "info": {}}
+_schema_lock = threading.Lock()
+
+def _sync_schema_cache(conn):
+    """Descarta o cache se o schema do banco mudou desde a última leitura"""
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    if version != _schema_cache["version"]:
+        _schema_cache["version"] = version
+        _schema_cache["tables"] = None
+        _schema_cache["info"] = {}
+
+def get_table_names(conn):
+    """Lista as tabelas do banco a partir do cache de schema (sem as tabelas internas)"""
+    with _schema_lock:
+        _sync_schema_cache(conn)
+        if _schema_cache["tables"] is None:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+            _schema_cache["tables"] = [row[0] for row in rows if row[0] not in INTERNAL_TABLES]
+        return list(_schema_cache["tables"])
+
+def get_table_info(conn, table_name):
+    """
+    Retorna os metadados cacheados de uma tabela, ou None se ela não existir ou for interna
+    (INTERNAL_TABLES, que as rotas tratam como inexistente):
+    {"pragma": linhas do PRAGMA table_info, "columns": [...], "types": {...}, "mes_col": ..., "ano_col": ...}
+    """
+    with _schema_lock:
+        _sync_schema_cache(conn)
+        if table_name in INTERNAL_TABLES:
+            return None
+        if table_name not in _schema_cache["info"]:
+            rows = [tuple(row) for row in conn.execute(f"PRAGMA table_info({table_name})").fetchall()]
+            info = None
+            if rows:
+                columns = [row[1] for row in rows]
+                mes_col, ano_col = resolver_colunas_periodo(columns)
+                info = {
+                    "pragma": rows,
+                    "columns": columns,
+                    "types": {row[1]: row[2] for row in rows},
+                    "mes_col": mes_col,
+                    "ano_col": ano_col,
+                    "has_periodo": "periodo_ano" in columns and "periodo_mes" in columns,
+                }
+            _schema_cache["info"][table_name] = info
+        return _schema_cache["info"][table_name]
+
+def data_select_list(table_info):
+    """
+    Lista do SELECT das leituras de dados: rowid e as colunas da tabela, sem as colunas
+    auxiliares de período (periodo_ano/periodo_mes, mantidas por triggers)
+    """
+    columns = [col for col in table_info["columns"] if col != 'rowid' and col not in COLUNAS_PERIODO]
+    return ", ".join(['rowid'] + [quote_identifier(col) for col in columns])
+
+def compute_table_etag(conn, table_name):
+    """
+    Calcula um ETag forte para a leitura atual de uma tabela, a partir do contador de
+    alterações da tabela (mantido por triggers), da versão do schema, da rota e dos
+    parâmetros da query. Retorna None se a tabela não tiver contador.
+    """
+    try:
+        row = conn.execute(
+            f"SELECT version FROM {TABLE_VERSIONS_TABLE} WHERE table_name = ?", (table_name,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None  # Banco ainda sem a migração de contadores
+    if row is None:
+        return None
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    key = json.dumps([
+        request.path,
+        sorted(request.args.items(multi=True)),
+        table_name,
+        row[0],
+        schema_version,
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def not_modified(etag):
+    """Resposta 304 para requisições cujo If-None-Match já corresponde ao ETag atual"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def with_etag(response, etag):
+    """Anexa o ETag (e exige revalidação) a uma resposta, se houver ETag"""
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def to_json_value(value):
+    """Converte um valor vindo do SQLite para um tipo serializável em JSON"""
+    # None, strings, números e booleanos ficam como estão
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    # Converter bytes para string (se necessário)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    # Converter outros tipos para string
+    return str(value)
+
 def row_to_dict(row):
     """Converte uma linha do SQLite para dicionário, tratando tipos especiais"""
-    result = {}
-    for key in row.keys():
-        value = row[key]
-        # Converter None para null (JSON)
-        if value is None:
-            result[key] = None
-        # Manter strings, números e booleanos como estão
-        elif isinstance(value, (str, int, float, bool)):
-            result[key] = value
-        # Converter bytes para string (se necessário)
-        elif isinstance(value, bytes):
-            result[key] = value.decode('utf-8', errors='ignore')
-        # Converter outros tipos para string
+    return {key: to_json_value(row[key]) for key in row.keys()}
+
+def _split_columns_arg(name):
+    """Lê um parâmetro com lista de colunas separadas por vírgula (?group_by=Ano,Mês)"""
+    value = request.args.get(name, '')
+    return [col.strip() for col in value.split(',') if col.strip()]
+
+def parse_pagination_args():
+    """Lê ?after_rowid= e ?limit= da requisição. Retorna (after_rowid, limit), None quando ausentes."""
+    after_rowid = request.args.get('after_rowid', '').strip()
+    limit = request.args.get('limit', '').strip()
+    
+    if after_rowid:
+        try:
+            after_rowid = int(after_rowid)
+        except ValueError:
+            raise ValueError("Parâmetro 'after_rowid' deve ser um número inteiro")
+    else:
+        after_rowid = None
+    
+    if limit:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("Parâmetro 'limit' deve ser um número inteiro")
+        if limit < 1 or limit > MAX_PAGE_LIMIT:
+            raise ValueError(f"Parâmetro 'limit' deve estar entre 1 e {MAX_PAGE_LIMIT}")
+    else:
+        limit = None
+    
+    return after_rowid, limit
+
+def build_period_conditions(table_info, mes, ano):
+    """
+    Monta as condições WHERE dos filtros ?mes= e ?ano=. Usa as colunas canônicas
+    indexadas periodo_mes/periodo_ano quando a tabela já as tem. Retorna (conditions, params).
+    """
+    conditions = []
+    params = []
+    
+    mes_col = table_info["mes_col"]
+    ano_col = table_info["ano_col"]
+    has_periodo = table_info["has_periodo"]
+    
+    # Aplicar filtros se as colunas existirem e os parâmetros foram fornecidos
+    if mes_col and mes:
+        # Converter o mês (nome, número ou data ISO) para número (1-12)
+        mes_num = normalizar_mes(mes)
+        
+        if mes_num and has_periodo:
+            # Coluna canônica indexada (periodo_ano, periodo_mes)
+            conditions.append("periodo_mes = ?")
+            params.append(mes_num)
+        elif mes_num:
+            # Tabela ainda sem colunas de período: comparar datas ISO, nomes e números
+            # Tentar múltiplas formas: data ISO (extrair mês), nome do mês, número
+            conditions.append(
+                f"(CAST(strftime('%m', {mes_col}) AS INTEGER) = ? OR "
+                f"LOWER(TRIM({mes_col})) = LOWER(?) OR "
+                f"CAST({mes_col} AS INTEGER) = ?)"
+            )
+            params.extend([mes_num, mes, mes_num])
         else:
-            result[key] = str(value)
-    return result
+            # Comparação direta (pode ser número ou formato diferente)
+            conditions.append(f"(LOWER(TRIM({mes_col})) = LOWER(?) OR {mes_col} = ?)")
+            params.extend([mes, mes])
+    
+    if (ano_col or has_periodo) and ano:
+        try:
+            ano_int = int(ano)
+            if has_periodo:
+                conditions.append("periodo_ano = ?")
+                params.append(ano_int)
+            # Se temos campo de mês que pode ser data, também filtrar por ano na data
+            elif mes_col:
+                conditions.append(
+                    f"((CAST(strftime('%Y', {mes_col}) AS INTEGER) = ?) OR ({ano_col} = ?))"
+                )
+                params.extend([ano_int, ano_int])
+            else:
+                conditions.append(f"{ano_col} = ?")
+                params.append(ano_int)
+        except ValueError:
+            pass  # Ignorar se ano não for numérico
+    
+    return conditions, params
+
+# Formatos de resposta de GET /api/data/<table_name> (?format=)
+#   objects:  "data": [{coluna: valor, ...}, ...]  (padrão)
+#   rows:     "columns": [...], "data": [[valor, ...], ...]
+#   columnar: "columns": [...], "data": [[valores da coluna 1], [valores da coluna 2], ...]
+DATA_FORMATS = ('objects', 'rows', 'columnar')
+
+def stream_rows_json(cursor, header, limit=None, fmt='objects'):
+    """
+    Gera a resposta JSON em pedaços (bytes), lendo o cursor em lotes em vez de fetchall().
+    
+    O primeiro campo de cada linha deve ser o rowid (SELECT rowid, ...). Ao final são
+    enviados "count" e "next_after_rowid" (cursor da próxima página ou null).
+    """
+    try:
+        # Colunas repetidas (ex.: "rowid, *" em tabelas com coluna rowid) aparecem uma vez só
+        names = [d[0] for d in cursor.description]
+        keep = [i for i, name in enumerate(names) if name not in names[:i]]
+        serializer = RowSerializer([names[i] for i in keep], keep)
+        
+        header = dict(header)
+        if fmt != 'objects':
+            header["format"] = fmt
+            header["columns"] = serializer.columns
+        yield json_dumps(header)[:-1] + b',"data":['  # Reabre o objeto para acrescentar os dados
+        
+        column_values = [[] for _ in keep] if fmt == 'columnar' else None
+        count = 0
+        last_rowid = None
+        has_more = False
+        while not has_more:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if limit is not None and count + len(rows) > limit:
+                rows = rows[:limit - count]
+                has_more = True
+            if not rows:
+                break
+            if column_values is not None:
+                for target, i in zip(column_values, keep):
+                    target.extend(row[i] for row in rows)
+            else:
+                encoded = serializer.arrays(rows) if fmt == 'rows' else serializer.objects(rows)
+                yield (b"," if count else b"") + encoded
+            last_rowid = rows[-1][0]
+            count += len(rows)
+        
+        if column_values is not None:
+            # Colunar: os valores só podem ser enviados depois de lidas todas as linhas da página
+            yield b",".join(json_dumps(values) for values in column_values)
+        
+        tail = {"count": count, "next_after_rowid": last_rowid if has_more else None}
+        yield b'],' + json_dumps(tail)[1:]
+    finally:
+        cursor.close()
 
 @app.route('/', methods=['GET'])
 def index():
@@ -130,17 +466,19 @@ def get_tables():
     """Retorna lista de todas as tabelas disponíveis"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        tables = get_table_names(conn)
         return jsonify({"tables": tables})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/data/<table_name>', methods=['GET'])
 def get_table_data(table_name):
-    """Retorna todos os dados de uma tabela específica, com filtros opcionais por mês e ano"""
+    """
+    Retorna os dados de uma tabela específica, com filtros opcionais por mês e ano.
+    
+    Suporta paginação por cursor (?after_rowid=&limit=); as linhas são enviadas em
+    streaming e a resposta traz "next_after_rowid" para buscar a próxima página.
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -150,131 +488,223 @@ def get_table_data(table_name):
         if not table_name.replace("_", "").replace("-", "").isalnum():
             return jsonify({"error": "Nome de tabela inválido"}), 400
         
-        # Verificar estrutura da tabela para saber quais colunas existem
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cursor.fetchall()
-        column_names = [col[1] for col in columns_info]
+        # Estrutura da tabela (colunas e colunas de mês/ano) vem do cache de schema
+        table_info = get_table_info(conn, table_name)
+        if table_info is None:
+            return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
+        
+        # Nada mudou desde a última leitura do cliente: 304 sem executar a query
+        etag = compute_table_etag(conn, table_name)
+        if etag and request.if_none_match.contains(etag):
+            return not_modified(etag)
         
         # Parâmetros de filtro opcionais
         mes = request.args.get('mes', '').strip()
         ano = request.args.get('ano', '').strip()
         
+        # Projeção de colunas (?fields=) e formato da resposta (?format=)
+        fields = _split_columns_arg('fields')
+        unknown = [col for col in fields if col not in table_info["columns"]]
+        if unknown:
+            return jsonify({"error": f"Colunas inexistentes em '{table_name}': {unknown}"}), 400
+        fmt = request.args.get('format', 'objects').strip() or 'objects'
+        if fmt not in DATA_FORMATS:
+            return jsonify({"error": f"Formato inválido. Use um de: {list(DATA_FORMATS)}"}), 400
+        
         # Construir query com filtros opcionais
-        query = f"SELECT rowid, * FROM {table_name}"
-        conditions = []
-        params = []
+        if fields:
+            projection = ", ".join(quote_identifier(col) for col in fields if col != 'rowid')
+            query = f"SELECT rowid{', ' + projection if projection else ''} FROM {table_name}"
+        else:
+            query = f"SELECT {data_select_list(table_info)} FROM {table_name}"
+        conditions, params = build_period_conditions(table_info, mes, ano)
         
-        # Verificar se a tabela tem colunas de mês e ano
-        has_mes_col = any('mês' in col.lower() or 'mes' in col.lower() for col in column_names)
-        has_ano_col = any('ano' in col.lower() for col in column_names)
-        
-        # Tentar encontrar colunas de mês e ano (case-insensitive)
-        mes_col = None
-        ano_col = None
-        
-        for col in column_names:
-            col_lower = col.lower()
-            if not mes_col and ('mês' in col_lower or 'mes' in col_lower):
-                mes_col = col
-            if not ano_col and 'ano' in col_lower:
-                ano_col = col
-        
-        # Aplicar filtros se as colunas existirem e os parâmetros foram fornecidos
-        if mes_col and mes:
-            # Converter nome do mês para número (1-12) para comparação com datas ISO
-            meses_nomes = {
-                'janeiro': 1, 'fevereiro': 2, 'março': 3, 'marco': 3,
-                'abril': 4, 'maio': 5, 'junho': 6,
-                'julho': 7, 'agosto': 8, 'setembro': 9,
-                'outubro': 10, 'novembro': 11, 'dezembro': 12
-            }
-            
-            mes_lower = mes.lower().strip()
-            mes_num = meses_nomes.get(mes_lower)
-            
-            # Construir condição que funciona tanto para datas ISO quanto para nomes de meses
-            # SQLite: strftime('%m', datetime_field) retorna '01'-'12' como string
-            if mes_num:
-                # Tentar múltiplas formas: data ISO (extrair mês), nome do mês, número
-                conditions.append(
-                    f"(CAST(strftime('%m', {mes_col}) AS INTEGER) = ? OR "
-                    f"LOWER(TRIM({mes_col})) = LOWER(?) OR "
-                    f"CAST({mes_col} AS INTEGER) = ?)"
-                )
-                params.extend([mes_num, mes, mes_num])
-            else:
-                # Comparação direta (pode ser número ou formato diferente)
-                conditions.append(f"(LOWER(TRIM({mes_col})) = LOWER(?) OR {mes_col} = ?)")
-                params.extend([mes, mes])
+        # Paginação por cursor: ?after_rowid=<último rowid recebido>&limit=<n>
+        try:
+            after_rowid, limit = parse_pagination_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if ano_col and ano:
-            try:
-                ano_int = int(ano)
-                # Se temos campo de mês que pode ser data, também filtrar por ano na data
-                if mes_col:
-                    conditions.append(
-                        f"((CAST(strftime('%Y', {mes_col}) AS INTEGER) = ?) OR ({ano_col} = ?))"
-                    )
-                    params.extend([ano_int, ano_int])
-                else:
-                    conditions.append(f"{ano_col} = ?")
-                    params.append(ano_int)
-            except ValueError:
-                pass  # Ignorar se ano não for numérico
+        if after_rowid is not None:
+            conditions.append("rowid > ?")
+            params.append(after_rowid)
         
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
         
-        # Executar query
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        query += " ORDER BY rowid"
+        if limit is not None:
+            # Busca um registro a mais para saber se existe próxima página
+            query += " LIMIT ?"
+            params.append(limit + 1)
         
-        # Converter para lista de dicionários
-        data = [row_to_dict(row) for row in rows]
+        # Executar query (erros de tabela inexistente acontecem aqui, antes do streaming)
+        cursor.row_factory = None  # Tuplas simples: o serializador não precisa de sqlite3.Row
+        cursor.execute(query, params)
         
-        return jsonify({
+        header = {
             "table": table_name,
-            "count": len(data),
-            "data": data,
             "filters": {
                 "mes": mes if mes else None,
                 "ano": ano if ano else None
             }
-        })
+        }
+        response = Response(
+            stream_with_context(stream_rows_json(cursor, header, limit, fmt)),
+            mimetype='application/json'
+        )
+        return with_etag(response, etag)
     except sqlite3.OperationalError as e:
         return jsonify({"error": f"Tabela '{table_name}' não encontrada", "details": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Tabelas expostas por /api/data/all (usuarios e tabelas internas nunca são enviadas)
+DATA_ALL_TABLES = (
+    'absenteísmo',
+    'base_kpi',
+    'base_dashboard',
+    'colaboradores',
+    'radar_de_competencias',
+    'avaliacoes',
+)
+
 @app.route('/api/data/all', methods=['GET'])
 def get_all_data():
-    """Retorna todos os dados de todas as tabelas"""
+    """
+    Retorna todos os dados das tabelas permitidas (DATA_ALL_TABLES).
+    
+    Com "Accept: application/x-ndjson" a resposta é enviada em streaming, uma linha
+    JSON por vez: cabeçalho da tabela, linhas de dados e um marcador de fim da tabela.
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Pegar todas as tabelas
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cursor.fetchall()]
+        # Pegar apenas as tabelas permitidas que existem no banco
+        existing = set(get_table_names(conn))
+        tables = [name for name in DATA_ALL_TABLES if name in existing]
+        
+        best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+        if best == 'application/x-ndjson':
+            return Response(stream_with_context(stream_tables_ndjson(conn, tables)), mimetype='application/x-ndjson')
         
         result = {}
         for table_name in tables:
-            cursor.execute(f"SELECT rowid, * FROM {table_name}")
+            cursor.execute(f"SELECT {data_select_list(get_table_info(conn, table_name))} FROM {table_name}")
             rows = cursor.fetchall()
             result[table_name] = {
                 "count": len(rows),
                 "data": [row_to_dict(row) for row in rows]
             }
         
-        conn.close()
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def stream_tables_ndjson(conn, tables):
+    """
+    Gera NDJSON para várias tabelas, lendo cada uma em lotes:
+    {"type": "table", "name": ...}, {"type": "row", "data": {...}}..., {"type": "end", "name": ..., "count": n}
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        for table_name in tables:
+            yield json_dumps({"type": "table", "name": table_name}) + b"\n"
+            cursor.execute(f"SELECT {data_select_list(get_table_info(conn, table_name))} FROM {table_name}")
+            names = [d[0] for d in cursor.description]
+            keep = [i for i, name in enumerate(names) if name not in names[:i]]
+            serializer = RowSerializer([names[i] for i in keep], keep)
+            count = 0
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                count += len(rows)
+                yield b"".join(
+                    b'{"type":"row","data":' + obj + b'}\n' for obj in serializer.object_lines(rows)
+                )
+            yield json_dumps({"type": "end", "name": table_name, "count": count}) + b"\n"
+    finally:
+        cursor.close()
+
+# Valores aceitos nas colunas (os tipos que o sqlite3 grava diretamente)
+SQLITE_VALUE_TYPES = (str, int, float, type(None))
+SQLITE_INT_RANGE = (-2**63, 2**63 - 1)
+
+def integer_primary_key(table_info):
+    """Coluna que é apelido do rowid (INTEGER PRIMARY KEY), ou None"""
+    pk_rows = [row for row in table_info["pragma"] if row[5]]
+    if len(pk_rows) == 1 and str(pk_rows[0][2]).upper() == 'INTEGER':
+        return pk_rows[0][1]
+    return None
+
+def validate_record_fields(record, columns):
+    """
+    Valida um registro (dict) contra as colunas da tabela.
+    Retorna (campos, None) ou (None, motivo da rejeição). Colunas desconhecidas são ignoradas.
+    """
+    if not isinstance(record, dict):
+        return None, "Registro não é um objeto JSON"
+    fields = {k: v for k, v in record.items() if k in columns}
+    if not fields:
+        unknown = sorted(record.keys())
+        return None, f"Nenhuma coluna válida no registro (desconhecidas: {unknown})" if unknown else "Registro vazio"
+    for column, value in fields.items():
+        if not isinstance(value, SQLITE_VALUE_TYPES):
+            return None, f"Valor não suportado na coluna '{column}' ({type(value).__name__})"
+        if isinstance(value, int) and not SQLITE_INT_RANGE[0] <= value <= SQLITE_INT_RANGE[1]:
+            return None, f"Inteiro fora do intervalo suportado na coluna '{column}'"
+    return fields, None
+
+def insert_record_group(cursor, table_name, columns, items, sequential_rowids):
+    """
+    Insere registros com as mesmas colunas. items: lista de (índice, valores).
+    Retorna ({índice: rowid}, [{"index", "reason"}]).
+    
+    Com sequential_rowids o lote vai num único executemany: dentro de uma transação
+    BEGIN IMMEDIATE os rowids novos são consecutivos e terminam em last_insert_rowid().
+    Se o lote falhar (ex.: restrição UNIQUE/NOT NULL) ele é desfeito e refeito linha a
+    linha, para identificar os registros rejeitados.
+    """
+    query = (
+        f"INSERT INTO {quote_identifier(table_name)} ({', '.join(quote_identifier(c) for c in columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    if sequential_rowids:
+        cursor.execute("SAVEPOINT insert_group")
+        try:
+            cursor.executemany(query, [values for _, values in items])
+        except sqlite3.IntegrityError:
+            cursor.execute("ROLLBACK TO insert_group")
+            cursor.execute("RELEASE insert_group")
+        else:
+            cursor.execute("RELEASE insert_group")
+            last_rowid = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            first_rowid = last_rowid - len(items) + 1
+            return {index: first_rowid + i for i, (index, _) in enumerate(items)}, []
+    
+    rowids = {}
+    rejected = []
+    for index, values in items:
+        try:
+            cursor.execute(query, values)
+        except sqlite3.IntegrityError as e:
+            rejected.append({"index": index, "reason": str(e)})
+        else:
+            rowids[index] = cursor.lastrowid
+    return rowids, rejected
+
 @app.route('/api/data/<table_name>', methods=['POST'])
 def add_data(table_name):
-    """Adiciona novos dados a uma tabela"""
+    """
+    Adiciona um registro (objeto) ou vários (lista) a uma tabela, numa única transação.
+    
+    Os registros são agrupados pelo conjunto de colunas e inseridos com executemany.
+    A resposta traz os rowids novos (na ordem dos registros aceitos) e o motivo de
+    cada registro rejeitado ({"index": posição na lista, "reason": ...}).
+    """
     try:
         data = request.get_json()
         
@@ -288,46 +718,54 @@ def add_data(table_name):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Verificar estrutura da tabela
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall()]
+        # Verificar estrutura da tabela (cache de schema)
+        table_info = get_table_info(conn, table_name)
+        columns = table_info["columns"] if table_info else []
         
         if not columns:
-            conn.close()
             return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
         
-        # Preparar dados para inserção
         # Se data é uma lista, inserir múltiplos registros
         if isinstance(data, list):
             records = data
         else:
             records = [data]
         
-        inserted_count = 0
-        for record in records:
-            # Filtrar apenas colunas que existem na tabela
-            filtered_record = {k: v for k, v in record.items() if k in columns}
-            
-            if not filtered_record:
+        # Validar e agrupar por assinatura de colunas (mesma ordem de chaves = mesmo INSERT)
+        pk_col = integer_primary_key(table_info)
+        groups = {}
+        rejected = []
+        for index, record in enumerate(records):
+            fields, reason = validate_record_fields(record, columns)
+            if reason:
+                rejected.append({"index": index, "reason": reason})
                 continue
-            
-            # Criar query de inserção
-            columns_str = ", ".join(filtered_record.keys())
-            placeholders = ", ".join(["?" for _ in filtered_record])
-            values = list(filtered_record.values())
-            
-            query = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-            cursor.execute(query, values)
-            inserted_count += 1
-        
-        conn.commit()
-        conn.close()
+            groups.setdefault(tuple(fields), []).append((index, list(fields.values())))
         
+        rowids = {}
+        if groups:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for signature, items in groups.items():
+                    # Registros com o INTEGER PRIMARY KEY informado não têm rowids consecutivos
+                    sequential = pk_col not in signature
+                    group_rowids, group_rejected = insert_record_group(cursor, table_name, signature, items, sequential)
+                    rowids.update(group_rowids)
+                    rejected.extend(group_rejected)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        rejected.sort(key=lambda item: item["index"])
+        inserted_count = len(rowids)
         return jsonify({
             "message": f"{inserted_count} registro(s) adicionado(s) com sucesso",
             "table": table_name,
-            "inserted": inserted_count
-        }), 201
+            "inserted": inserted_count,
+            "rowids": [rowids[index] for index in sorted(rowids)],
+            "rejected": rejected
+        }), 201 if inserted_count or not rejected else 400
         
     except sqlite3.OperationalError as e:
         return jsonify({"error": f"Erro ao inserir dados: {str(e)}"}), 400
@@ -350,19 +788,17 @@ def update_data(table_name, record_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Verificar estrutura da tabela
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall()]
+        # Verificar estrutura da tabela (cache de schema)
+        table_info = get_table_info(conn, table_name)
+        columns = table_info["columns"] if table_info else []
         
         if not columns:
-            conn.close()
             return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
         
         # Filtrar apenas colunas que existem
         filtered_data = {k: v for k, v in data.items() if k in columns}
         
         if not filtered_data:
-            conn.close()
             return jsonify({"error": "Nenhum campo válido para atualizar"}), 400
         
         # Criar query de atualização
@@ -373,11 +809,9 @@ def update_data(table_name, record_id):
         cursor.execute(query, values)
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({"error": "Registro não encontrado"}), 404
         
         conn.commit()
-        conn.close()
         
         return jsonify({
             "message": "Registro atualizado com sucesso",
@@ -399,15 +833,17 @@ def delete_data(table_name, record_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # Tabelas inexistentes ou internas (cache de schema)
+        if get_table_info(conn, table_name) is None:
+            return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
+        
         query = f"DELETE FROM {table_name} WHERE rowid = ?"
         cursor.execute(query, (record_id,))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({"error": "Registro não encontrado"}), 404
         
         conn.commit()
-        conn.close()
         
         return jsonify({
             "message": "Registro deletado com sucesso",
@@ -418,6 +854,152 @@ def delete_data(table_name, record_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+BATCH_OPERATIONS = ('update', 'delete')
+
+def existing_rowids(cursor, table_name, rowids, chunk_size=500):
+    """Conjunto dos rowids informados que existem na tabela (consulta em blocos)"""
+    rowids = list(dict.fromkeys(rowids))
+    found = set()
+    for start in range(0, len(rowids), chunk_size):
+        chunk = rowids[start:start + chunk_size]
+        cursor.execute(
+            f"SELECT rowid FROM {quote_identifier(table_name)} WHERE rowid IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        )
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+def run_operation_group(cursor, query, items, results):
+    """
+    Executa um grupo de operações de mesmo formato com executemany. items: lista de
+    (índice, parâmetros, status). Se o lote violar uma restrição ele é desfeito e refeito
+    operação a operação, marcando as que falharem como rejeitadas.
+    """
+    cursor.execute("SAVEPOINT operation_group")
+    try:
+        cursor.executemany(query, [params for _, params, _ in items])
+    except sqlite3.IntegrityError:
+        cursor.execute("ROLLBACK TO operation_group")
+    else:
+        for index, _, status in items:
+            results[index]["status"] = status
+        return
+    finally:
+        cursor.execute("RELEASE operation_group")
+    
+    for index, params, status in items:
+        try:
+            cursor.execute(query, params)
+        except sqlite3.IntegrityError as e:
+            results[index].update(status="rejected", reason=str(e))
+        else:
+            results[index]["status"] = status
+
+@app.route('/api/data/<table_name>/batch', methods=['POST'])
+def batch_data(table_name):
+    """
+    Aplica várias alterações numa única transação.
+    
+    Body: [{"op": "update", "rowid": 1, "fields": {...}}, {"op": "delete", "rowid": 2}, ...]
+    Operações consecutivas de mesmo formato (mesma op e mesmas colunas) vão num único
+    executemany. Cada operação recebe um resultado: updated, deleted, not_found ou rejected.
+    """
+    try:
+        operations = request.get_json()
+        
+        if not operations or not isinstance(operations, list):
+            return jsonify({"error": "Envie uma lista de operações"}), 400
+        
+        # Validação do nome da tabela (permite letras, números, underscores e hífens)
+        if not table_name.replace("_", "").replace("-", "").isalnum():
+            return jsonify({"error": "Nome de tabela inválido"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        table_info = get_table_info(conn, table_name)
+        if table_info is None:
+            return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
+        columns = table_info["columns"]
+        pk_col = integer_primary_key(table_info)
+        table = quote_identifier(table_name)
+        
+        # Validar cada operação antes de abrir a transação
+        results = []
+        valid = []
+        for index, operation in enumerate(operations):
+            result = {"index": index}
+            results.append(result)
+            if not isinstance(operation, dict):
+                result.update(status="rejected", reason="Operação não é um objeto JSON")
+                continue
+            op = operation.get("op")
+            rowid = operation.get("rowid")
+            result.update(op=op, rowid=rowid)
+            if op not in BATCH_OPERATIONS:
+                result.update(status="rejected", reason=f"Operação inválida (use {list(BATCH_OPERATIONS)})")
+                continue
+            if not isinstance(rowid, int) or isinstance(rowid, bool):
+                result.update(status="rejected", reason="rowid deve ser um número inteiro")
+                continue
+            fields = None
+            if op == 'update':
+                fields, reason = validate_record_fields(operation.get("fields"), columns)
+                if not reason and pk_col in fields:
+                    reason = f"Não é permitido alterar a coluna '{pk_col}'"
+                if reason:
+                    result.update(status="rejected", reason=reason)
+                    continue
+            valid.append((index, op, rowid, fields))
+        
+        if valid:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = existing_rowids(cursor, table_name, [rowid for _, _, rowid, _ in valid])
+                
+                # Agrupar operações consecutivas de mesmo formato, preservando a ordem do lote
+                groups = []
+                for index, op, rowid, fields in valid:
+                    if rowid not in existing:
+                        results[index]["status"] = "not_found"
+                        continue
+                    if op == 'delete':
+                        existing.discard(rowid)  # Operações seguintes nesse rowid: not_found
+                        shape = (op,)
+                        item = (index, (rowid,), "deleted")
+                    else:
+                        shape = (op, tuple(fields))
+                        item = (index, list(fields.values()) + [rowid], "updated")
+                    if groups and groups[-1][0] == shape:
+                        groups[-1][1].append(item)
+                    else:
+                        groups.append((shape, [item]))
+                
+                for shape, items in groups:
+                    if shape[0] == 'delete':
+                        query = f"DELETE FROM {table} WHERE rowid = ?"
+                    else:
+                        set_clause = ", ".join(f"{quote_identifier(col)} = ?" for col in shape[1])
+                        query = f"UPDATE {table} SET {set_clause} WHERE rowid = ?"
+                    run_operation_group(cursor, query, items, results)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        totals = {status: 0 for status in ("updated", "deleted", "not_found", "rejected")}
+        for result in results:
+            totals[result["status"]] += 1
+        
+        return jsonify({
+            "table": table_name,
+            **totals,
+            "results": results
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Tabelas permitidas para zerar (segurança: evitar apagar outras tabelas)
 CLEAR_ALLOWED_TABLES = {'absenteísmo', 'base_kpi'}
 
@@ -433,7 +1015,6 @@ def clear_table(table_name):
         count = cursor.fetchone()[0]
         cursor.execute(f"DELETE FROM {table_name}")
         conn.commit()
-        conn.close()
         return jsonify({
             "message": f"Tabela '{table_name}' zerada com sucesso",
             "registros_removidos": count
@@ -450,15 +1031,15 @@ def get_table_schema(table_name):
             return jsonify({"error": "Nome de tabela inválido"}), 400
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        conn.close()
+        table_info = get_table_info(conn, table_name)
         
-        if not columns:
+        if table_info is None:
             return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
         
+        etag = compute_table_etag(conn, table_name)
+        if etag and request.if_none_match.contains(etag):
+            return not_modified(etag)
+        
         schema = [
             {
                 "cid": col[0],
@@ -468,20 +1049,25 @@ def get_table_schema(table_name):
                 "default_value": col[4],
                 "pk": bool(col[5])
             }
-            for col in columns
+            for col in table_info["pragma"]
         ]
         
-        return jsonify({
+        return with_etag(jsonify({
             "table": table_name,
             "schema": schema
-        })
+        }), etag)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/data/<table_name>/filters', methods=['GET'])
 def get_table_filters(table_name):
-    """Retorna os valores únicos de mês e ano disponíveis em uma tabela"""
+    """
+    Retorna os valores únicos de mês e ano disponíveis em uma tabela.
+    
+    Os valores vêm da tabela filter_facets (mantida por triggers): meses em ordem de
+    calendário e anos do mais recente para o mais antigo.
+    """
     try:
         # Validação do nome da tabela (permite letras, números, underscores e hífens)
         if not table_name.replace("_", "").replace("-", "").isalnum():
@@ -490,37 +1076,34 @@ def get_table_filters(table_name):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Verificar estrutura da tabela
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cursor.fetchall()
-        column_names = [col[1] for col in columns_info]
-        
-        # Encontrar colunas de mês e ano
-        mes_col = None
-        ano_col = None
+        # Colunas de mês e ano vêm do cache de schema
+        table_info = get_table_info(conn, table_name)
+        if table_info is None:
+            return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
+        mes_col = table_info["mes_col"]
+        ano_col = table_info["ano_col"]
         
-        for col in column_names:
-            col_lower = col.lower()
-            if not mes_col and ('mês' in col_lower or 'mes' in col_lower):
-                mes_col = col
-            if not ano_col and 'ano' in col_lower:
-                ano_col = col
+        etag = compute_table_etag(conn, table_name)
+        if etag and request.if_none_match.contains(etag):
+            return not_modified(etag)
         
         meses = []
         anos = []
         
-        if mes_col:
-            cursor.execute(f"SELECT DISTINCT {mes_col} FROM {table_name} WHERE {mes_col} IS NOT NULL AND {mes_col} != ''")
-            meses = [row[0] for row in cursor.fetchall() if row[0]]
-        
-        if ano_col:
-            cursor.execute(f"SELECT DISTINCT {ano_col} FROM {table_name} WHERE {ano_col} IS NOT NULL AND {ano_col} != ''")
-            anos = [int(row[0]) for row in cursor.fetchall() if row[0] and str(row[0]).isdigit()]
-            anos = sorted(set(anos), reverse=True)  # Ordenar do mais recente para o mais antigo
-        
-        conn.close()
-        
-        return jsonify({
+        if mes_col or ano_col:
+            cursor.execute(
+                f"SELECT column_name, value FROM {FILTER_FACETS_TABLE} "
+                f"WHERE table_name = ? ORDER BY column_name, sort_key, value",
+                (table_name,),
+            )
+            for column_name, value in cursor.fetchall():
+                if column_name == mes_col:
+                    meses.append(value)
+                if column_name == ano_col and str(value).isdigit():
+                    anos.append(int(value))
+            anos = list(dict.fromkeys(reversed(anos)))  # Do mais recente para o mais antigo
+        
+        return with_etag(jsonify({
             "table": table_name,
             "meses": meses,
             "anos": anos,
@@ -528,672 +1111,667 @@ def get_table_filters(table_name):
                 "mes": mes_col,
                 "ano": ano_col
             }
-        })
+        }), etag)
         
     except sqlite3.OperationalError as e:
         return jsonify({"error": f"Tabela '{table_name}' não encontrada", "details": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/upload/folha-ponto', methods=['POST'])
-def upload_folha_ponto():
-    """Processa PDF de folha de ponto e extrai dados de absenteísmo, horas extras e custos"""
-    if not PDF_AVAILABLE:
-        return jsonify({"error": "Biblioteca pdfplumber não está instalada"}), 500
-    
-    if 'file' not in request.files:
-        return jsonify({"error": "Nenhum arquivo enviado"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "Nome de arquivo vazio"}), 400
-    
-    if not file.filename.lower().endswith('.pdf'):
-        return jsonify({"error": "Arquivo deve ser PDF"}), 400
+# Tabelas permitidas para agregação no servidor
+AGGREGATE_ALLOWED_TABLES = {'absenteísmo', 'base_kpi'}
+NUMERIC_TYPES = ('INT', 'REAL', 'FLOA', 'DOUB', 'NUM', 'DEC')
+
+@app.route('/api/aggregate/<table_name>', methods=['GET'])
+def aggregate_table(table_name):
+    """
+    Agrega uma tabela no banco em vez de enviar todas as linhas ao frontend.
     
+    Exemplo: /api/aggregate/base_kpi?group_by=Ano,Mês,KPI&sum=Valor&count=1&ano=2025
+    As colunas de mês/ano são agrupadas pelas colunas canônicas periodo_mes/periodo_ano.
+    """
     try:
-        # Salvar arquivo temporariamente
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            file.save(tmp_file.name)
-            tmp_path = tmp_file.name
-        
-        # Extrair dados do PDF
-        dados_extraidos = extrair_dados_folha_ponto(tmp_path)
-        
-        # Limpar arquivo temporário
-        os.unlink(tmp_path)
-        
-        # Validar dados extraídos
-        if not dados_extraidos:
-            return jsonify({
-                "error": "Nenhum dado foi extraído do PDF",
-                "message": "Verifique se o formato do PDF está correto ou se contém os dados esperados"
-            }), 400
-        
-        # Inserir dados no banco
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if table_name not in AGGREGATE_ALLOWED_TABLES:
+            return jsonify({"error": f"Tabela não permitida para agregação. Permitidas: {sorted(AGGREGATE_ALLOWED_TABLES)}"}), 400
         
-        # Criar tabela absenteísmo se não existir
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS absenteísmo (
-                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
-                CPF TEXT,
-                Nome TEXT,
-                Mês TEXT,
-                Ano INTEGER,
-                Horas_Extras REAL,
-                Custo_Horas_Extras REAL,
-                Faltas REAL,
-                Abonos REAL,
-                Salário REAL,
-                Valor_Hora_Extra REAL
-            )
-        """)
-        
-        # Adicionar colunas se não existirem (para tabelas já criadas)
-        try:
-            cursor.execute("ALTER TABLE absenteísmo ADD COLUMN Salário REAL")
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
-        
-        try:
-            cursor.execute("ALTER TABLE absenteísmo ADD COLUMN Valor_Hora_Extra REAL")
-        except sqlite3.OperationalError:
-            pass  # Coluna já existe
-        
-        conn.commit()
-        
-        resultados = []
-        for registro in dados_extraidos:
-            # Verificar se já existe registro para este colaborador/mês/ano
-            cursor.execute("""
-                SELECT rowid FROM absenteísmo 
-                WHERE CPF = ? AND Mês = ? AND Ano = ?
-            """, (registro.get('cpf'), registro.get('mes'), registro.get('ano')))
-            
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Atualizar
-                cursor.execute("""
-                    UPDATE absenteísmo 
-                    SET Horas_Extras = ?, Custo_Horas_Extras = ?, Faltas = ?, Abonos = ?, Salário = ?, Valor_Hora_Extra = ?
-                    WHERE rowid = ?
-                """, (
-                    registro.get('horas_extras', 0),
-                    registro.get('custo_horas_extras', 0),
-                    registro.get('faltas', 0),
-                    registro.get('abonos', 0),
-                    registro.get('salario', 0),
-                    registro.get('valor_hora_extra', 0),
-                    existing[0]
-                ))
-                resultados.append({
-                    "status": "atualizado", 
-                    "cpf": registro.get('cpf'),
-                    "nome": registro.get('nome'),
-                    "salario": registro.get('salario', 0),
-                    "horas_extras": registro.get('horas_extras', 0),
-                    "custo": registro.get('custo_horas_extras', 0)
-                })
+        conn = get_db_connection()
+        table_info = get_table_info(conn, table_name)
+        if table_info is None:
+            return jsonify({"error": f"Tabela '{table_name}' não encontrada"}), 404
+        if not table_info["has_periodo"]:
+            return jsonify({"error": f"Tabela '{table_name}' ainda não possui as colunas de período"}), 409
+        
+        group_by = _split_columns_arg('group_by')
+        sum_cols = _split_columns_arg('sum')
+        with_count = request.args.get('count', '').strip().lower() in ('1', 'true', 'sim')
+        
+        # Validar colunas contra o schema cacheado
+        columns = table_info["columns"]
+        unknown = [col for col in group_by + sum_cols if col not in columns]
+        if unknown:
+            return jsonify({"error": f"Colunas inexistentes em '{table_name}': {unknown}"}), 400
+        not_numeric = [
+            col for col in sum_cols
+            if not any(t in (table_info["types"].get(col) or '').upper() for t in NUMERIC_TYPES)
+        ]
+        if not_numeric:
+            return jsonify({"error": f"Colunas não numéricas em sum: {not_numeric}"}), 400
+        overlap = set(group_by) & set(sum_cols)
+        if overlap:
+            return jsonify({"error": f"Colunas não podem estar em group_by e sum ao mesmo tempo: {sorted(overlap)}"}), 400
+        if not sum_cols and not with_count:
+            return jsonify({"error": "Informe ao menos uma coluna em sum ou count=1"}), 400
+        
+        etag = compute_table_etag(conn, table_name)
+        if etag and request.if_none_match.contains(etag):
+            return not_modified(etag)
+        
+        # Mês e ano agrupados pelas colunas canônicas (mesmo período em formatos diferentes)
+        group_exprs = []
+        for col in group_by:
+            if col == table_info["mes_col"]:
+                group_exprs.append("periodo_mes")
+            elif col == table_info["ano_col"]:
+                group_exprs.append("periodo_ano")
             else:
-                # Inserir novo
-                cursor.execute("""
-                    INSERT INTO absenteísmo (CPF, Nome, Mês, Ano, Horas_Extras, Custo_Horas_Extras, Faltas, Abonos, Salário, Valor_Hora_Extra)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    registro.get('cpf'),
-                    registro.get('nome'),
-                    registro.get('mes'),
-                    registro.get('ano'),
-                    registro.get('horas_extras', 0),
-                    registro.get('custo_horas_extras', 0),
-                    registro.get('faltas', 0),
-                    registro.get('abonos', 0),
-                    registro.get('salario', 0),
-                    registro.get('valor_hora_extra', 0)
-                ))
-                resultados.append({
-                    "status": "inserido", 
-                    "cpf": registro.get('cpf'),
-                    "nome": registro.get('nome'),
-                    "salario": registro.get('salario', 0),
-                    "horas_extras": registro.get('horas_extras', 0),
-                    "custo": registro.get('custo_horas_extras', 0)
-                })
+                group_exprs.append(quote_identifier(col))
         
-        conn.commit()
-        conn.close()
+        select = list(group_exprs)
+        select += [f"SUM({quote_identifier(col)})" for col in sum_cols]
+        if with_count:
+            select.append("COUNT(*)")
         
-        return jsonify({
-            "message": f"Processado com sucesso: {len(resultados)} registro(s)",
-            "resultados": resultados,
-            "dados_extraidos": dados_extraidos
-        }), 200
+        query = f"SELECT {', '.join(select)} FROM {quote_identifier(table_name)}"
+        conditions, params = build_period_conditions(
+            table_info, request.args.get('mes', '').strip(), request.args.get('ano', '').strip()
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if group_exprs:
+            query += f" GROUP BY {', '.join(group_exprs)} ORDER BY {', '.join(group_exprs)}"
+        
+        result = []
+        for row in conn.execute(query, params):
+            item = {}
+            for i, col in enumerate(group_by):
+                value = row[i]
+                if group_exprs[i] == "periodo_mes" and value:
+                    value = MESES[value - 1]
+                item[col] = value
+            offset = len(group_by)
+            for i, col in enumerate(sum_cols):
+                item[col] = row[offset + i]
+            if with_count:
+                item["count"] = row[-1]
+            result.append(item)
+        
+        return with_etag(jsonify({
+            "table": table_name,
+            "group_by": group_by,
+            "sum": sum_cols,
+            "count": len(result),
+            "data": result
+        }), etag)
         
     except Exception as e:
-        import traceback
-        return jsonify({
-            "error": f"Erro ao processar PDF: {str(e)}",
-            "traceback": traceback.format_exc()
-        }), 500
+        return jsonify({"error": str(e)}), 500
 
-def extrair_dados_folha_ponto(pdf_path):
-    """Extrai dados de absenteísmo, horas extras e custos de um PDF de folha de ponto"""
-    dados = []
+def existing_natural_keys(cursor, table_name, keys, chunk_size=300):
+    """Conjunto das chaves naturais (tuplas) informadas que já existem na tabela (busca pelo índice único)"""
+    key_columns, _ = NATURAL_KEYS[table_name]
+    cols = ", ".join(quote_identifier(col) for col in key_columns)
+    where = natural_key_where(table_name)
+    row_placeholder = "(" + ", ".join("?" for _ in key_columns) + ")"
+    keys = list(dict.fromkeys(keys))
+    found = set()
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        cursor.execute(
+            f"SELECT {cols} FROM {quote_identifier(table_name)} "
+            f"WHERE ({cols}) IN (VALUES {', '.join(row_placeholder for _ in chunk)})"
+            + (f" AND {where}" if where else ""),
+            [value for key in chunk for value in key],
+        )
+        found.update(tuple(row) for row in cursor.fetchall())
+    return found
+
+def upsert_natural_key_rows(cursor, table_name, columns, rows, update_columns):
+    """
+    Grava as linhas (tuplas na ordem de columns) com um único INSERT ... ON CONFLICT DO UPDATE
+    (executemany) sobre a chave natural da tabela. Em conflito só update_columns são alteradas.
+    Retorna o status de cada linha: "inserido" ou "atualizado".
+
+    Deve rodar numa transação já aberta com BEGIN IMMEDIATE, para que a consulta das chaves
+    existentes e a gravação vejam o mesmo estado da tabela.
+    """
+    key_columns, required = NATURAL_KEYS[table_name]
+    key_indexes = [columns.index(col) for col in key_columns]
+    required_indexes = [columns.index(col) for col in required]
+    keys = [tuple(row[i] for i in key_indexes) for row in rows]
     
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if not text:
-                    continue
-                
-                # Extrair informações do colaborador
-                cpf_match = re.search(r'CPF:\s*(\d{3}\.\d{3}\.\d{3}-\d{2})', text)
-                nome_match = re.search(r'Empregado:\s*([^\n]+)', text)
-                periodo_match = re.search(r'Período:\s*(\d{2}/\d{2}/\d{4})\s*à\s*(\d{2}/\d{2}/\d{4})', text)
-                
-                if not (cpf_match and nome_match and periodo_match):
-                    continue
-                
-                cpf = cpf_match.group(1).replace('.', '').replace('-', '')
-                nome = nome_match.group(1).strip()
-                data_inicio = periodo_match.group(1)
-                data_fim = periodo_match.group(2)
-                
-                # Extrair mês e ano do período
-                try:
-                    dt_fim = datetime.strptime(data_fim, '%d/%m/%Y')
-                    mes = dt_fim.strftime('%B')  # Nome do mês em inglês
-                    # Converter para português
-                    meses_pt = {
-                        'January': 'Janeiro', 'February': 'Fevereiro', 'March': 'Março',
-                        'April': 'Abril', 'May': 'Maio', 'June': 'Junho',
-                        'July': 'Julho', 'August': 'Agosto', 'September': 'Setembro',
-                        'October': 'Outubro', 'November': 'Novembro', 'December': 'Dezembro'
-                    }
-                    mes = meses_pt.get(mes, mes)
-                    ano = dt_fim.year
-                except:
-                    continue
-                
-                # Extrair totais de horas extras
-                # Procurar por padrões como "TOTALS" ou "Total" seguido de horas
-                horas_extras = 0
-                faltas = 0
-                abonos = 0
-                
-                # Procurar por totais na tabela
-                totals_match = re.search(r'TOTALS.*?(\d{1,2}):(\d{2})', text, re.DOTALL)
-                if totals_match:
-                    horas = int(totals_match.group(1))
-                    minutos = int(totals_match.group(2))
-                    horas_extras = horas + (minutos / 60)
-                
-                # Procurar por faltas (linhas com "Faltantes")
-                faltas_match = re.findall(r'Faltantes.*?(\d{1,2}):(\d{2})', text)
-                if faltas_match:
-                    for f in faltas_match:
-                        faltas += int(f[0]) + (int(f[1]) / 60)
-                
-                # Procurar por abonos (linhas com "Abonadas")
-                abonos_match = re.findall(r'Abonadas.*?(\d{1,2}):(\d{2})', text)
-                if abonos_match:
-                    for a in abonos_match:
-                        abonos += int(a[0]) + (int(a[1]) / 60)
-                
-                # Buscar salário do colaborador no banco
-                conn_temp = get_db_connection()
-                cursor_temp = conn_temp.cursor()
-                
-                # Tentar encontrar colaborador por CPF (com ou sem formatação)
-                cpf_formatado = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
-                cursor_temp.execute("""
-                    SELECT Salário, "Salário", salário, "Salario", salario 
-                    FROM colaboradores 
-                    WHERE CPF = ? OR CPF = ? OR REPLACE(REPLACE(REPLACE(CPF, '.', ''), '-', ''), ' ', '') = ?
-                """, (cpf, cpf_formatado, cpf))
-                
-                salario_result = cursor_temp.fetchone()
-                salario = 0
-                
-                if salario_result:
-                    # Tentar encontrar o primeiro valor não nulo
-                    for val in salario_result:
-                        if val is not None:
-                            try:
-                                salario = float(val)
-                                break
-                            except (ValueError, TypeError):
-                                continue
-                
-                conn_temp.close()
-                
-                # Calcular valor da hora extra baseado no salário
-                # Assumindo 220 horas/mês (44h semanais * 5 semanas)
-                horas_mes = 220
-                valor_hora_normal = salario / horas_mes if horas_mes > 0 else 0
-                # Hora extra = 50% adicional (1.5x) ou 100% (2x) dependendo do caso
-                # Usando 1.5x como padrão (50% adicional)
-                valor_hora_extra = valor_hora_normal * 1.5
-                custo_horas_extras = horas_extras * valor_hora_extra
-                
-                dados.append({
-                    'cpf': cpf,
-                    'nome': nome,
-                    'mes': mes,
-                    'ano': ano,
-                    'horas_extras': round(horas_extras, 2),
-                    'custo_horas_extras': round(custo_horas_extras, 2),
-                    'faltas': round(faltas, 2),
-                    'abonos': round(abonos, 2),
-                    'salario': salario,
-                    'valor_hora_extra': round(valor_hora_extra, 2)
-                })
+    # Classificar antes de gravar: chaves existentes (ou repetidas no próprio lote) viram atualização
+    existing = existing_natural_keys(cursor, table_name, keys)
+    statuses = []
+    for row, key in zip(rows, keys):
+        in_key = all(value is not None for value in key) and all(row[i] not in (None, '') for i in required_indexes)
+        if in_key and key in existing:
+            statuses.append("atualizado")
+        else:
+            statuses.append("inserido")
+            if in_key:
+                existing.add(key)
     
+    cursor.executemany(natural_key_upsert_sql(table_name, columns, update_columns), rows)
+    return statuses
+
+# Jobs em segundo plano (uploads de PDF); o estado fica na tabela jobs. Com JOB_MODE=worker
+# quem executa é o job_worker.py, e UPLOAD_DIR precisa ser uma pasta que ele também enxergue
+job_runner = JobRunner(get_db_connection)
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR') or None
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status de um job: progresso por página e, ao terminar, o resultado ou o erro"""
+    try:
+        job = job_runner.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job não encontrado"}), 404
+        response = jsonify(job)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     except Exception as e:
-        raise Exception(f"Erro ao extrair dados do PDF: {str(e)}")
-    
-    return dados
+        return jsonify({"error": str(e)}), 500
 
-@app.route('/api/upload/folha-iob', methods=['POST'])
-def upload_folha_iob():
-    """Processa PDF da folha IOB e extrai dados financeiros"""
-    print("\n" + "="*80)
-    print("UPLOAD FOLHA IOB - INICIANDO")
-    print("="*80)
-    
+def salvar_pdf_enviado():
+    """
+    Valida o PDF enviado no campo "file" e o salva num arquivo temporário.
+    Retorna (caminho, nome original, None) ou (None, None, resposta de erro).
+    """
     if not PDF_AVAILABLE:
-        print("ERRO: pdfplumber não está instalado")
-        return jsonify({"error": "Biblioteca pdfplumber não está instalada"}), 500
+        return None, None, (jsonify({"error": "Biblioteca pdfplumber não está instalada"}), 500)
     
     if 'file' not in request.files:
-        print("ERRO: Nenhum arquivo enviado")
-        return jsonify({"error": "Nenhum arquivo enviado"}), 400
+        return None, None, (jsonify({"error": "Nenhum arquivo enviado"}), 400)
     
     file = request.files['file']
     if file.filename == '':
-        print("ERRO: Nome de arquivo vazio")
-        return jsonify({"error": "Nome de arquivo vazio"}), 400
+        return None, None, (jsonify({"error": "Nome de arquivo vazio"}), 400)
     
     if not file.filename.lower().endswith('.pdf'):
-        print("ERRO: Arquivo não é PDF")
-        return jsonify({"error": "Arquivo deve ser PDF"}), 400
+        return None, None, (jsonify({"error": "Arquivo deve ser PDF"}), 400)
+    
+    # Salvar arquivo temporariamente (o job apaga ao terminar)
+    import tempfile
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=UPLOAD_DIR) as tmp_file:
+        file.save(tmp_file.name)
+        return tmp_file.name, file.filename, None
+
+def job_aceito(job_id):
+    """Resposta 202 de um upload enfileirado"""
+    status_url = f"/api/jobs/{job_id}"
+    response = jsonify({
+        "message": "PDF recebido; processamento em segundo plano",
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": status_url
+    })
+    response.headers['Location'] = status_url
+    return response, 202
+
+@app.route('/api/upload/folha-ponto', methods=['POST'])
+def upload_folha_ponto():
+    """
+    Recebe o PDF de folha de ponto e enfileira o processamento (extração de absenteísmo,
+    horas extras e custos + gravação no banco). Responde 202 com o id do job.
+    """
+    try:
+        tmp_path, nome_arquivo, erro = salvar_pdf_enviado()
+        if erro:
+            return erro
+        try:
+            job_id = job_runner.submit('folha-ponto', nome_arquivo, tmp_path, nome_arquivo)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        logger.info("upload folha-ponto arquivo=%s job=%s", nome_arquivo, job_id)
+        return job_aceito(job_id)
+    except JobError as e:
+        # Servidor sem threads para executar o job (ver jobs.THREADS_INDISPONIVEIS)
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": f"Erro ao enfileirar PDF: {str(e)}"}), 500
+
+def processar_folha_ponto(pdf_path, nome_arquivo=None, progresso=None):
+    """Job do upload de folha de ponto: extrai os dados do PDF e grava em absenteísmo"""
+    resumo = {}
+    try:
+        dados_extraidos = extrair_dados_folha_ponto(pdf_path, progresso, resumo, nome_arquivo)
+    finally:
+        os.unlink(pdf_path)
+    
+    # Validar dados extraídos
+    if not dados_extraidos:
+        raise JobError("Nenhum dado foi extraído do PDF. Verifique se o formato do PDF está correto ou se contém os dados esperados"
+                       f" (páginas por tipo: {_formatar_tipos(resumo.get('paginas_por_tipo', {})) or 'nenhuma'})")
     
-    print(f"Arquivo recebido: {file.filename}")
-    print(f"Tamanho do arquivo: {file.content_length} bytes")
+    # Inserir dados no banco (tabela, colunas e índice da chave vêm das migrações)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Um único UPSERT para todos os colaboradores (chave CPF/Mês/Ano)
+    colunas = ('CPF', 'Nome', 'Mês', 'Ano', 'Horas_Extras', 'Custo_Horas_Extras',
+               'Faltas', 'Abonos', 'Salário', 'Valor_Hora_Extra')
+    linhas = [(
+        registro.get('cpf'),
+        registro.get('nome'),
+        registro.get('mes'),
+        registro.get('ano'),
+        registro.get('horas_extras', 0),
+        registro.get('custo_horas_extras', 0),
+        registro.get('faltas', 0),
+        registro.get('abonos', 0),
+        registro.get('salario', 0),
+        registro.get('valor_hora_extra', 0)
+    ) for registro in dados_extraidos]
+    timer = StageTimer(logger, 'gravacao folha-ponto', tabela='absenteísmo')
+    with timer.stage('upsert'):
+        # Classificação (SELECT das chaves) e UPSERT na mesma transação de escrita: jobs
+        # simultâneos não classificam a mesma chave como "inserido"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            statuses = upsert_natural_key_rows(cursor, 'absenteísmo', colunas, linhas, colunas[4:])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    timer.log(inseridos=statuses.count("inserido"), atualizados=statuses.count("atualizado"))
+    
+    resultados = [{
+        "status": status,
+        "cpf": registro.get('cpf'),
+        "nome": registro.get('nome'),
+        "salario": registro.get('salario', 0),
+        "horas_extras": registro.get('horas_extras', 0),
+        "custo": registro.get('custo_horas_extras', 0)
+    } for registro, status in zip(dados_extraidos, statuses)]
+    
+    return {
+        "message": f"Processado com sucesso: {len(resultados)} registro(s)",
+        "inseridos": statuses.count("inserido"),
+        "atualizados": statuses.count("atualizado"),
+        "resultados": resultados,
+        "dados_extraidos": dados_extraidos,
+        "paginas_por_tipo": resumo.get('paginas_por_tipo')
+    }
+
+def _formatar_tipos(tipos):
+    """paginas_por_tipo numa linha de log: funcionario:24,totais:2"""
+    return ",".join(f"{tipo}:{quantidade}" for tipo, quantidade in tipos.items())
+
+SALARIO_COLUNAS = ('Salário', 'Salario')
+
+def normalizar_cpf(valor):
+    """CPF só com os dígitos (11, com zeros à esquerda), ou "" se não houver dígitos"""
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # CPF importado do Excel como número
+    digitos = re.sub(r'\D', '', str(valor))
+    return digitos.zfill(11) if digitos else ""
+
+def carregar_salarios_por_cpf(conn):
+    """Mapa CPF normalizado -> salário da tabela colaboradores, lido numa única consulta"""
+    info = get_table_info(conn, 'colaboradores')
+    if info is None:
+        return {}
+    colunas = {coluna.lower(): coluna for coluna in info["columns"]}
+    salario_col = next((colunas[nome.lower()] for nome in SALARIO_COLUNAS if nome.lower() in colunas), None)
+    if 'cpf' not in colunas or salario_col is None:
+        return {}
+    
+    salarios = {}
+    cursor = conn.execute(
+        f"SELECT {quote_identifier(colunas['cpf'])}, {quote_identifier(salario_col)} FROM colaboradores ORDER BY rowid"
+    )
+    for cpf, salario in cursor:
+        chave = normalizar_cpf(cpf)
+        if not chave or salario is None:
+            continue
+        try:
+            salarios.setdefault(chave, float(salario))  # Com CPF repetido vale o primeiro cadastro
+        except (ValueError, TypeError):
+            continue
+    return salarios
+
+def extrair_dados_folha_ponto(pdf_path, progresso=None, resumo=None, nome_arquivo=None):
+    """
+    Extrai dados de absenteísmo, horas extras e custos de um PDF de folha de ponto.
+    progresso(pagina, total), se informado, é chamado após cada página.
+    resumo, se informado, recebe paginas_por_tipo (classificacao_paginas.contar_tipos).
+    nome_arquivo: nome original do upload, usado no log no lugar do arquivo temporário.
+    """
+    dados = []
+    salarios = None
+    arquivo = nome_arquivo or Path(pdf_path).name
+    timer = StageTimer(logger, 'extracao folha-ponto', arquivo=arquivo)
     
     try:
-        # Salvar arquivo temporariamente
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            file.save(tmp_file.name)
-            tmp_path = tmp_file.name
-        
-        print(f"Arquivo salvo temporariamente em: {tmp_path}")
-        
-        # Extrair dados do PDF
-        print("Chamando função extrair_dados_folha_iob...")
-        dados_extraidos = extrair_dados_folha_iob(tmp_path)
-        print(f"Dados extraídos: {len(dados_extraidos)} registros")
-        for d in dados_extraidos:
-            print(f"  - {d}")
-        
-        # Limpar arquivo temporário
-        os.unlink(tmp_path)
-        
-        # Validar dados extraídos
-        if not dados_extraidos:
-            return jsonify({
-                "error": "Nenhum dado foi extraído do PDF",
-                "message": "Verifique se o formato do PDF está correto ou se contém os dados esperados"
-            }), 400
-        
-        # Inserir dados no banco (base_kpi)
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        resultados = []
-        for registro in dados_extraidos:
-            # Verificar se já existe registro para este KPI/mês/ano
-            cursor.execute("""
-                SELECT rowid FROM base_kpi 
-                WHERE KPI = ? AND Mês = ? AND Ano = ?
-            """, (registro.get('kpi'), registro.get('mes'), registro.get('ano')))
+        # Só as páginas de espelho de ponto e, nelas, só o cabeçalho e a faixa de totais (folha_ponto.py)
+        with timer.stage('paginas'):
+            paginas = extrair_paginas(pdf_path, progresso=progresso, recorte=RecorteFolhaPonto(),
+                                      classificador=ClassificadorPaginas(PONTO))
+        tipos = contar_tipos(paginas)
+        if resumo is not None:
+            resumo['paginas_por_tipo'] = tipos
+        if logger.isEnabledFor(logging.DEBUG):
+            for pagina in paginas:
+                logger.debug("folha-ponto página %s/%s tipo=%s", pagina["numero"], len(paginas), pagina["tipo"])
+        
+        for pagina in paginas:
+            registro = ler_pagina(pagina["texto"])
+            if registro is None:
+                continue
             
-            existing = cursor.fetchone()
+            cpf = registro['cpf']
+            nome = registro['nome']
             
-            if existing:
-                # Atualizar
-                cursor.execute("""
-                    UPDATE base_kpi 
-                    SET Valor = ?
-                    WHERE rowid = ?
-                """, (registro.get('valor'), existing[0]))
-                resultados.append({"status": "atualizado", "kpi": registro.get('kpi')})
-            else:
-                # Inserir novo
-                cursor.execute("""
-                    INSERT INTO base_kpi (KPI, Mês, Ano, Valor, Tipo)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    registro.get('kpi'),
-                    registro.get('mes'),
-                    registro.get('ano'),
-                    registro.get('valor'),
-                    registro.get('tipo', 'Folha')
-                ))
-                resultados.append({"status": "inserido", "kpi": registro.get('kpi')})
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            "message": f"Processado com sucesso: {len(resultados)} registro(s)",
-            "resultados": resultados,
-            "dados_extraidos": dados_extraidos
-        }), 200
+            # Extrair mês e ano do período
+            try:
+                dt_fim = datetime.strptime(registro['data_fim'], '%d/%m/%Y')
+                mes = dt_fim.strftime('%B')  # Nome do mês em inglês
+                # Converter para português
+                meses_pt = {
+                    'January': 'Janeiro', 'February': 'Fevereiro', 'March': 'Março',
+                    'April': 'Abril', 'May': 'Maio', 'June': 'Junho',
+                    'July': 'Julho', 'August': 'Agosto', 'September': 'Setembro',
+                    'October': 'Outubro', 'November': 'Novembro', 'December': 'Dezembro'
+                }
+                mes = meses_pt.get(mes, mes)
+                ano = dt_fim.year
+            except:
+                continue
+            
+            horas_extras = registro['horas_extras']
+            faltas = registro['faltas']
+            abonos = registro['abonos']
+            
+            # Salário do colaborador pelo CPF normalizado (mapa carregado uma vez por upload)
+            if salarios is None:
+                salarios = carregar_salarios_por_cpf(get_db_connection())
+            salario = salarios.get(cpf, 0)
+            
+            # Calcular valor da hora extra baseado no salário
+            # Assumindo 220 horas/mês (44h semanais * 5 semanas)
+            horas_mes = 220
+            valor_hora_normal = salario / horas_mes if horas_mes > 0 else 0
+            # Hora extra = 50% adicional (1.5x) ou 100% (2x) dependendo do caso
+            # Usando 1.5x como padrão (50% adicional)
+            valor_hora_extra = valor_hora_normal * 1.5
+            custo_horas_extras = horas_extras * valor_hora_extra
+            
+            dados.append({
+                'cpf': cpf,
+                'nome': nome,
+                'mes': mes,
+                'ano': ano,
+                'horas_extras': round(horas_extras, 2),
+                'custo_horas_extras': round(custo_horas_extras, 2),
+                'faltas': round(faltas, 2),
+                'abonos': round(abonos, 2),
+                'salario': salario,
+                'valor_hora_extra': round(valor_hora_extra, 2)
+            })
+        
+        timer.log(paginas=len(paginas), tipos=_formatar_tipos(tipos),
+                  recortadas=sum(1 for p in paginas if p.get("recortada")), colaboradores=len(dados))
+    except Exception as e:
+        logger.exception("extracao folha-ponto falhou arquivo=%s", arquivo)
+        raise Exception(f"Erro ao extrair dados do PDF: {str(e)}")
+    
+    return dados
+
+@app.route('/api/upload/folha-iob', methods=['POST'])
+def upload_folha_iob():
+    """Recebe o PDF da folha IOB e enfileira a extração dos dados financeiros. Responde 202 com o id do job."""
+    try:
+        tmp_path, nome_arquivo, erro = salvar_pdf_enviado()
+        if erro:
+            return erro
         
+        try:
+            job_id = job_runner.submit('folha-iob', nome_arquivo, tmp_path, nome_arquivo)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        logger.info("upload folha-iob arquivo=%s job=%s", nome_arquivo, job_id)
+        return job_aceito(job_id)
+    except JobError as e:
+        # Servidor sem threads para executar o job (ver jobs.THREADS_INDISPONIVEIS)
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        import traceback
-        return jsonify({
-            "error": f"Erro ao processar PDF: {str(e)}",
-            "traceback": traceback.format_exc()
-        }), 500
-
-def extrair_dados_folha_iob(pdf_path):
-    """Extrai dados financeiros de um PDF da folha IOB no formato específico"""
-    import sys
-    sys.stdout.flush()  # Forçar flush do buffer
+        return jsonify({"error": f"Erro ao enfileirar PDF: {str(e)}"}), 500
+
+def processar_folha_iob(pdf_path, nome_arquivo=None, progresso=None):
+    """Job do upload da folha IOB: extrai os totais do PDF e grava em base_kpi"""
+    resumo = {}
+    try:
+        dados_extraidos = extrair_dados_folha_iob(pdf_path, progresso, resumo, nome_arquivo)
+        if logger.isEnabledFor(logging.DEBUG):
+            for registro in dados_extraidos:
+                logger.debug("folha-iob registro %s", format_fields(registro))
+    finally:
+        os.unlink(pdf_path)
     
-    dados = []
+    # Validar dados extraídos
+    if not dados_extraidos:
+        raise JobError("Nenhum dado foi extraído do PDF. Verifique se o formato do PDF está correto ou se contém os dados esperados"
+                       f" (páginas por tipo: {_formatar_tipos(resumo.get('paginas_por_tipo', {})) or 'nenhuma'})")
+    
+    # Inserir dados no banco (base_kpi)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Um único UPSERT para todos os KPIs (chave KPI/Mês/Ano); em conflito só o Valor muda
+    linhas = [(
+        registro.get('kpi'),
+        registro.get('mes'),
+        registro.get('ano'),
+        registro.get('valor'),
+        registro.get('tipo', 'Folha')
+    ) for registro in dados_extraidos]
+    timer = StageTimer(logger, 'gravacao folha-iob', tabela='base_kpi')
+    with timer.stage('upsert'):
+        # Classificação (SELECT das chaves) e UPSERT na mesma transação de escrita: jobs
+        # simultâneos não classificam a mesma chave como "inserido"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            statuses = upsert_natural_key_rows(cursor, 'base_kpi', ('KPI', 'Mês', 'Ano', 'Valor', 'Tipo'), linhas, ('Valor',))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    timer.log(inseridos=statuses.count("inserido"), atualizados=statuses.count("atualizado"))
     
-    print(f"\n{'='*80}")
-    print("FUNÇÃO extrair_dados_folha_iob CHAMADA")
-    print(f"{'='*80}")
-    print(f"PDF path: {pdf_path}")
+    resultados = [
+        {"status": status, "kpi": registro.get('kpi')}
+        for registro, status in zip(dados_extraidos, statuses)
+    ]
+    
+    return {
+        "message": f"Processado com sucesso: {len(resultados)} registro(s)",
+        "inseridos": statuses.count("inserido"),
+        "atualizados": statuses.count("atualizado"),
+        "resultados": resultados,
+        "dados_extraidos": dados_extraidos,
+        "paginas_por_tipo": resumo.get('paginas_por_tipo')
+    }
+
+job_runner.register('folha-ponto', processar_folha_ponto)
+job_runner.register('folha-iob', processar_folha_iob)
+
+def extrair_dados_folha_iob(pdf_path, progresso=None, resumo=None, nome_arquivo=None):
+    """
+    Extrai dados financeiros de um PDF da folha IOB no formato específico.
+    progresso(pagina, total), se informado, é chamado após cada página.
+    resumo, se informado, recebe paginas_por_tipo (classificacao_paginas.contar_tipos).
+    nome_arquivo: nome original do upload, usado no log no lugar do arquivo temporário.
+    """
+    dados = []
+    arquivo = nome_arquivo or Path(pdf_path).name
+    timer = StageTimer(logger, 'extracao folha-iob', arquivo=arquivo)
     
     try:
-        print("Abrindo PDF...")
-        with pdfplumber.open(pdf_path) as pdf:
-            print(f"PDF aberto! Total de páginas: {len(pdf.pages)}")
-            sys.stdout.flush()
-            
-            text_completo = ""
-            for page_num, page in enumerate(pdf.pages, 1):
-                print(f"\nProcessando página {page_num}/{len(pdf.pages)}...")
-                sys.stdout.flush()
-                page_text = page.extract_text()
-                if page_text:
-                    text_completo += page_text + "\n"
-                    print(f"PÁGINA {page_num} - {len(page_text)} caracteres extraídos")
-                    print("-" * 80)
-                    # Mostrar primeiros 1000 caracteres
-                    preview = page_text[:1000] + "..." if len(page_text) > 1000 else page_text
-                    print(preview)
-                    print("-" * 80)
+        # As páginas de totalização no fim da folha não têm o texto extraído; as de tipo 'outra'
+        # são mantidas, pois podem continuar um bloco de funcionário
+        with timer.stage('paginas'):
+            paginas = extrair_paginas(pdf_path, progresso=progresso,
+                                      classificador=ClassificadorPaginas(FUNCIONARIO, OUTRA))
+        tipos = contar_tipos(paginas)
+        if resumo is not None:
+            resumo['paginas_por_tipo'] = tipos
+        
+        with timer.stage('texto'):
+            text_completo = "".join(f"{pagina['texto']}\n" for pagina in paginas if pagina["texto"])
+        if logger.isEnabledFor(logging.DEBUG):
+            for pagina in paginas:
+                if LOG_PDF_TEXT:
+                    logger.debug("folha-iob página %s/%s tipo=%s:\n%s", pagina["numero"], len(paginas),
+                                 pagina["tipo"], pagina["texto"])
                 else:
-                    print(f"PÁGINA {page_num}: SEM TEXTO EXTRAÍDO!")
-                sys.stdout.flush()
-            
-            print(f"\n{'='*80}")
-            print("TEXTO COMPLETO EXTRAÍDO:")
-            print(f"{'='*80}")
-            print(text_completo)
-            print(f"{'='*80}")
-            print(f"Total de caracteres: {len(text_completo)}")
-            print(f"{'='*80}\n")
-            sys.stdout.flush()
-            
-            # Extrair período (mês/ano) do cabeçalho
-            # Padrão: "Mês/Ano: 01/2025" ou "Relação do Pagamento Mensal Mês/Ano: 01/2025"
-            periodo_match = re.search(r'Mês/Ano:\s*(\d{2})/(\d{4})', text_completo, re.IGNORECASE)
-            if not periodo_match:
-                periodo_match = re.search(r'Relação do Pagamento Mensal.*?(\d{2})/(\d{4})', text_completo, re.IGNORECASE | re.DOTALL)
-            
+                    logger.debug("folha-iob página %s/%s tipo=%s", pagina["numero"], len(paginas), pagina["tipo"])
+        
+        # Extrair período (mês/ano) do cabeçalho
+        # Padrão: "Mês/Ano: 01/2025" ou "Relação do Pagamento Mensal Mês/Ano: 01/2025"
+        periodo_match = re.search(r'Mês/Ano:\s*(\d{2})/(\d{4})', text_completo, re.IGNORECASE)
+        if not periodo_match:
+            periodo_match = re.search(r'Relação do Pagamento Mensal.*?(\d{2})/(\d{4})', text_completo, re.IGNORECASE | re.DOTALL)
+        
+        if periodo_match:
+            mes_num = int(periodo_match.group(1))
+            ano = int(periodo_match.group(2))
+            meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+                    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+            mes = meses[mes_num - 1] if 1 <= mes_num <= 12 else 'Janeiro'
+        else:
+            # Tentar padrão alternativo
+            periodo_match = re.search(r'(\d{2})/(\d{4})', text_completo)
             if periodo_match:
                 mes_num = int(periodo_match.group(1))
                 ano = int(periodo_match.group(2))
                 meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
                         'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
                 mes = meses[mes_num - 1] if 1 <= mes_num <= 12 else 'Janeiro'
-                print(f"DEBUG: Período extraído: {mes}/{ano}")
-            else:
-                # Tentar padrão alternativo
-                periodo_match = re.search(r'(\d{2})/(\d{4})', text_completo)
-                if periodo_match:
-                    mes_num = int(periodo_match.group(1))
-                    ano = int(periodo_match.group(2))
-                    meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
-                            'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
-                    mes = meses[mes_num - 1] if 1 <= mes_num <= 12 else 'Janeiro'
-                    print(f"DEBUG: Período extraído (alternativo): {mes}/{ano}")
-                else:
-                    mes = 'Janeiro'
-                    ano = datetime.now().year
-                    print(f"DEBUG: Período não encontrado, usando padrão: {mes}/{ano}")
-            
-            # Inicializar totais agregados
-            total_vencimentos = 0.0
-            total_descontos = 0.0
-            total_liquido = 0.0
-            total_fgts = 0.0
-            total_salario_base = 0.0
-            total_encargos_inss = 0.0
-            total_encargos_irrf = 0.0
-            
-            # Encontrar todos os blocos de funcionário usando regex mais flexível
-            # Padrão: "Funcionário: 126 - AGNALDO MACEDO COSTA" ou "Funcionário: 220 - ALAN..."
-            funcionarios_pattern = r'Funcionário:\s*\d+\s*-\s*([A-ZÁÉÍÓÚÇÃÕÊÔ\s]+?)(?=Funcionário:|Total|$)'
-            funcionarios_matches = list(re.finditer(funcionarios_pattern, text_completo, re.IGNORECASE | re.MULTILINE))
-            
-            print(f"DEBUG: Encontrados {len(funcionarios_matches)} funcionários")
-            
-            # Se não encontrou com o padrão acima, tentar dividir por "Funcionário:"
-            if len(funcionarios_matches) == 0:
-                # Dividir por "Funcionário:" e processar cada bloco
-                partes = re.split(r'Funcionário:\s*\d+\s*-\s*', text_completo)
-                print(f"DEBUG: Dividido em {len(partes)} partes")
-                
-                for i, parte in enumerate(partes[1:], 1):  # Pular primeira parte (cabeçalho)
-                    func_text = parte
-                    if not func_text.strip():
-                        continue
-                    
-                    # Extrair nome (primeira linha até encontrar "Adm:" ou quebra de linha)
-                    nome_match = re.search(r'^([A-ZÁÉÍÓÚÇÃÕÊÔ\s]+?)(?:\s+Adm:|$)', func_text, re.MULTILINE)
-                    nome = nome_match.group(1).strip() if nome_match else f"Funcionário {i}"
-                    
-                    # Extrair valores usando regex mais flexível
-                    # Salário Base
-                    salario_base_match = re.search(r'Salário Base:\s*([\d.,]+)', func_text, re.IGNORECASE)
-                    if salario_base_match:
-                        salario_base_str = salario_base_match.group(1).replace('.', '').replace(',', '.')
-                        try:
-                            salario_base = float(salario_base_str)
-                            total_salario_base += salario_base
-                            print(f"DEBUG: {nome} - Salário Base: {salario_base}")
-                        except ValueError:
-                            pass
-                    
-                    # Total de Vencimentos
-                    vencimentos_match = re.search(r'Total de Vencimentos:\s*([\d.,]+)', func_text, re.IGNORECASE)
-                    if vencimentos_match:
-                        vencimentos_str = vencimentos_match.group(1).replace('.', '').replace(',', '.')
-                        try:
-                            vencimentos = float(vencimentos_str)
-                            total_vencimentos += vencimentos
-                            print(f"DEBUG: {nome} - Vencimentos: {vencimentos}")
-                        except ValueError:
-                            pass
-                    
-                    # Total de Descontos
-                    descontos_match = re.search(r'Total de Descontos:\s*([\d.,]+)', func_text, re.IGNORECASE)
-                    if descontos_match:
-                        descontos_str = descontos_match.group(1).replace('.', '').replace(',', '.')
-                        try:
-                            descontos = float(descontos_str)
-                            total_descontos += descontos
-                            print(f"DEBUG: {nome} - Descontos: {descontos}")
-                        except ValueError:
-                            pass
-                    
-                    # Líquido a Receber
-                    liquido_match = re.search(r'Líquido a Receber:\s*([\d.,]+)', func_text, re.IGNORECASE)
-                    if liquido_match:
-                        liquido_str = liquido_match.group(1).replace('.', '').replace(',', '.')
-                        try:
-                            liquido = float(liquido_str)
-                            total_liquido += liquido
-                            print(f"DEBUG: {nome} - Líquido: {liquido}")
-                        except ValueError:
-                            pass
-                    
-                    # Valor do FGTS
-                    fgts_match = re.search(r'Valor do FGTS:\s*([\d.,]+)', func_text, re.IGNORECASE)
-                    if fgts_match:
-                        fgts_str = fgts_match.group(1).replace('.', '').replace(',', '.')
-                        try:
-                            fgts = float(fgts_str)
-                            total_fgts += fgts
-                            print(f"DEBUG: {nome} - FGTS: {fgts}")
-                        except ValueError:
-                            pass
-                    
-                    # Desconto INSS - padrão: "00080 DESCONTO INSS 8,7200% 283,40"
-                    # Procurar por "DESCONTO INSS" seguido de porcentagem e depois valor
-                    inss_patterns = [
-                        r'DESCONTO INSS[^\d]*[\d.,]+\%[^\d]*([\d.,]+)',  # Com porcentagem
-                        r'DESCONTO INSS[^\d]+([\d.,]+)',  # Sem porcentagem explícita
-                    ]
-                    for pattern in inss_patterns:
-                        inss_match = re.search(pattern, func_text, re.IGNORECASE)
-                        if inss_match:
-                            inss_str = inss_match.group(1).replace('.', '').replace(',', '.')
-                            try:
-                                inss = float(inss_str)
-                                total_encargos_inss += inss
-                                print(f"DEBUG: {nome} - INSS: {inss}")
-                                break
-                            except ValueError:
-                                continue
-                    
-                    # Desconto IRRF - padrão: "00081 DESCONTO I.R.R.F. 7,50% 31,95"
-                    # Pode estar como "DESCONTO I.R.R.F." ou "DESCONTO IRRF"
-                    irrf_patterns = [
-                        r'DESCONTO I\.?R\.?R\.?F\.?[^\d]*[\d.,]+\%[^\d]*([\d.,]+)',  # Com porcentagem e pontos
-                        r'DESCONTO I\.?R\.?R\.?F\.?[^\d]+([\d.,]+)',  # Sem porcentagem explícita
-                    ]
-                    for pattern in irrf_patterns:
-                        irrf_match = re.search(pattern, func_text, re.IGNORECASE)
-                        if irrf_match:
-                            irrf_str = irrf_match.group(1).replace('.', '').replace(',', '.')
-                            try:
-                                irrf = float(irrf_str)
-                                total_encargos_irrf += irrf
-                                print(f"DEBUG: {nome} - IRRF: {irrf}")
-                                break
-                            except ValueError:
-                                continue
+                logger.debug("folha-iob período pelo padrão alternativo: %s/%s", mes, ano)
             else:
-                # Processar usando matches encontrados
-                for match in funcionarios_matches:
-                    nome = match.group(1).strip()
-                    # Pegar texto após o nome até o próximo funcionário
-                    start_pos = match.end()
-                    next_match = funcionarios_matches[funcionarios_matches.index(match) + 1] if funcionarios_matches.index(match) + 1 < len(funcionarios_matches) else None
-                    end_pos = next_match.start() if next_match else len(text_completo)
-                    func_text = text_completo[start_pos:end_pos]
-                    
-                    # Mesma lógica de extração acima...
-                    # (código similar ao bloco acima)
-            
-            print(f"DEBUG: Totais - Vencimentos: {total_vencimentos}, Descontos: {total_descontos}, Líquido: {total_liquido}, FGTS: {total_fgts}")
-            
-            # Criar registros agregados para base_kpi
-            if total_vencimentos > 0:
-                dados.append({
-                    'kpi': 'Folha de pagamento',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_vencimentos,
-                    'tipo': 'Folha'
-                })
-            
-            if total_salario_base > 0:
-                dados.append({
-                    'kpi': 'Salário Base Total',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_salario_base,
-                    'tipo': 'Folha'
-                })
-            
-            if total_descontos > 0:
-                dados.append({
-                    'kpi': 'Descontos Total',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_descontos,
-                    'tipo': 'Folha'
-                })
-            
-            if total_liquido > 0:
-                dados.append({
-                    'kpi': 'Líquido Total',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_liquido,
-                    'tipo': 'Folha'
-                })
-            
-            if total_fgts > 0:
-                dados.append({
-                    'kpi': 'Encargos FGTS',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_fgts,
-                    'tipo': 'Folha'
-                })
-            
-            if total_encargos_inss > 0:
-                dados.append({
-                    'kpi': 'Encargos INSS',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_encargos_inss,
-                    'tipo': 'Folha'
-                })
-            
-            if total_encargos_irrf > 0:
-                dados.append({
-                    'kpi': 'Encargos IRRF',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': total_encargos_irrf,
-                    'tipo': 'Folha'
-                })
-            
-            # Calcular encargos totais (FGTS + INSS + IRRF)
-            encargos_total = total_fgts + total_encargos_inss + total_encargos_irrf
-            if encargos_total > 0:
-                dados.append({
-                    'kpi': 'Encargos',
-                    'mes': mes,
-                    'ano': ano,
-                    'valor': encargos_total,
-                    'tipo': 'Folha'
-                })
-            
-            print(f"DEBUG: Total de registros criados: {len(dados)}")
+                mes = 'Janeiro'
+                ano = datetime.now().year
+                logger.warning("folha-iob período não encontrado em %s, usando %s/%s", Path(pdf_path).name, mes, ano)
+        
+        # Inicializar totais agregados
+        total_vencimentos = 0.0
+        total_descontos = 0.0
+        total_liquido = 0.0
+        total_fgts = 0.0
+        total_salario_base = 0.0
+        total_encargos_inss = 0.0
+        total_encargos_irrf = 0.0
+        
+        # Blocos "Funcionário: N - NOME" lidos numa única passada (folha_iob.py)
+        with timer.stage('funcionarios'):
+            funcionarios = extrair_funcionarios(text_completo)
+        
+        for funcionario in funcionarios:
+            total_salario_base += funcionario['salario_base'] or 0.0
+            total_vencimentos += funcionario['vencimentos'] or 0.0
+            total_descontos += funcionario['descontos'] or 0.0
+            total_liquido += funcionario['liquido'] or 0.0
+            total_fgts += funcionario['fgts'] or 0.0
+            total_encargos_inss += funcionario['inss'] or 0.0
+            total_encargos_irrf += funcionario['irrf'] or 0.0
+        if logger.isEnabledFor(logging.DEBUG):
+            for funcionario in funcionarios:
+                logger.debug("folha-iob funcionário %s", format_fields(funcionario))
+        
+        # Criar registros agregados para base_kpi
+        if total_vencimentos > 0:
+            dados.append({
+                'kpi': 'Folha de pagamento',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_vencimentos,
+                'tipo': 'Folha'
+            })
+        
+        if total_salario_base > 0:
+            dados.append({
+                'kpi': 'Salário Base Total',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_salario_base,
+                'tipo': 'Folha'
+            })
+        
+        if total_descontos > 0:
+            dados.append({
+                'kpi': 'Descontos Total',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_descontos,
+                'tipo': 'Folha'
+            })
+        
+        if total_liquido > 0:
+            dados.append({
+                'kpi': 'Líquido Total',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_liquido,
+                'tipo': 'Folha'
+            })
+        
+        if total_fgts > 0:
+            dados.append({
+                'kpi': 'Encargos FGTS',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_fgts,
+                'tipo': 'Folha'
+            })
+        
+        if total_encargos_inss > 0:
+            dados.append({
+                'kpi': 'Encargos INSS',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_encargos_inss,
+                'tipo': 'Folha'
+            })
+        
+        if total_encargos_irrf > 0:
+            dados.append({
+                'kpi': 'Encargos IRRF',
+                'mes': mes,
+                'ano': ano,
+                'valor': total_encargos_irrf,
+                'tipo': 'Folha'
+            })
+        
+        # Calcular encargos totais (FGTS + INSS + IRRF)
+        encargos_total = total_fgts + total_encargos_inss + total_encargos_irrf
+        if encargos_total > 0:
+            dados.append({
+                'kpi': 'Encargos',
+                'mes': mes,
+                'ano': ano,
+                'valor': encargos_total,
+                'tipo': 'Folha'
+            })
+        
+        timer.log(paginas=len(paginas), tipos=_formatar_tipos(tipos), caracteres=len(text_completo), periodo=f"{mes}/{ano}",
+                  funcionarios=len(funcionarios), registros=len(dados))
     
     except Exception as e:
-        import traceback
-        print(f"DEBUG: Erro na extração: {str(e)}")
-        print(f"DEBUG: Traceback: {traceback.format_exc()}")
+        logger.exception("extracao folha-iob falhou arquivo=%s", arquivo)
         raise Exception(f"Erro ao extrair dados do PDF IOB: {str(e)}")
     
     return dados
@@ -1224,31 +1802,6 @@ def criar_avaliacao():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Criar tabela se não existir
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS avaliacoes (
-                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
-                token TEXT UNIQUE NOT NULL,
-                colaborador_id TEXT,
-                colaborador_nome TEXT,
-                gestor_nome TEXT,
-                gestor_email TEXT,
-                periodo TEXT,
-                data_criacao TEXT,
-                data_preenchimento TEXT,
-                status TEXT DEFAULT 'pendente',
-                Assiduidade REAL,
-                Segurança REAL,
-                Produtividade REAL,
-                Disciplina REAL,
-                Trabalho_em_equipe REAL,
-                Colaboração REAL,
-                Avaliação_do_Funcionário REAL,
-                Pontos_de_Melhoria TEXT,
-                Observações TEXT
-            )
-        """)
-        
         # Inserir avaliação
         data_criacao = datetime.now().isoformat()
         cursor.execute("""
@@ -1258,7 +1811,6 @@ def criar_avaliacao():
         """, (token, colaborador_id, colaborador_nome, gestor_nome, gestor_email, periodo, data_criacao))
         
         conn.commit()
-        conn.close()
         
         # Gerar URL do link
         base_url = request.host_url.rstrip('/')
@@ -1283,7 +1835,6 @@ def obter_avaliacao(token):
         
         cursor.execute("SELECT * FROM avaliacoes WHERE token = ?", (token,))
         row = cursor.fetchone()
-        conn.close()
         
         if not row:
             return jsonify({"error": "Avaliação não encontrada"}), 404
@@ -1309,7 +1860,6 @@ def salvar_avaliacao(token):
         # Verificar se a avaliação existe
         cursor.execute("SELECT rowid FROM avaliacoes WHERE token = ?", (token,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({"error": "Avaliação não encontrada"}), 404
         
         # Atualizar avaliação
@@ -1344,7 +1894,6 @@ def salvar_avaliacao(token):
         ))
         
         conn.commit()
-        conn.close()
         
         return jsonify({
             "message": "Avaliação salva com sucesso",
@@ -1371,7 +1920,6 @@ def login():
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM usuarios WHERE email = ?", (email,))
         usuario = cursor.fetchone()
-        conn.close()
         
         if not usuario:
             print(f"❌ Usuário não encontrado: {email}")
@@ -1428,7 +1976,6 @@ def listar_avaliacoes():
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
         
         avaliacoes = [row_to_dict(row) for row in rows]
         
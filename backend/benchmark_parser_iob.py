@@ -0,0 +1,101 @@
+"""
+Benchmark do parser da folha IOB (folha_iob.py).
+
+Compara o caminho anterior (split por "Funcionário:" e um re.search por campo em cada
+bloco) com a passada única de folha_iob.iterar_funcionarios, sobre o texto_completo
+dos JSONs de PDF/extraidos.
+
+Uso:
+    python benchmark_parser_iob.py [--pasta PDF/extraidos] [--repeticoes N]
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from folha_iob import extrair_funcionarios
+
+PASTA_PADRAO = Path(__file__).parent / 'PDF' / 'extraidos'
+
+
+def _valor_antigo(s):
+    try:
+        return float(s.replace('.', '').replace(',', '.'))
+    except ValueError:
+        return 0.0
+
+
+def extrair_antigo(texto):
+    """Cópia do caminho anterior: re.split por funcionário e um re.search por campo"""
+    resultado = []
+    partes = re.split(r"Funcionário:\s*(\d+)\s*-\s*", texto)
+    for i in range(1, len(partes) - 1, 2):
+        bloco = partes[i + 1]
+        nome_match = re.search(r"^([^\n]+?)(?:\s+Adm:|\n)", bloco, re.MULTILINE)
+        registro = {"matricula": partes[i], "nome": nome_match.group(1).strip() if nome_match else ""}
+        for campo, padrao in (
+            ("adm", r"Adm:\s*(\d{2}/\d{2}/\d{4})"),
+            ("funcao", r"Função:\s*([^\n]+)"),
+            ("salario_base", r"Salário Base:\s*([\d.,]+)"),
+            ("vencimentos", r"Total de Vencimentos:\s*([\d.,]+)"),
+            ("descontos", r"Total de Descontos:\s*([\d.,]+)"),
+            ("liquido", r"Líquido a Receber:\s*([\d.,]+)"),
+            ("fgts", r"Valor do FGTS:\s*([\d.,]+)"),
+            ("faltas", r"FALTAS INJUSTIFICADAS\s+(\d+)"),
+        ):
+            m = re.search(padrao, bloco, re.IGNORECASE)
+            registro[campo] = m.group(1) if m else None
+        for campo, padroes in (
+            ("inss", (r'DESCONTO INSS[^\d]*[\d.,]+\%[^\d]*([\d.,]+)', r'DESCONTO INSS[^\d]+([\d.,]+)')),
+            ("irrf", (r'DESCONTO I\.?R\.?R\.?F\.?[^\d]*[\d.,]+\%[^\d]*([\d.,]+)',
+                      r'DESCONTO I\.?R\.?R\.?F\.?[^\d]+([\d.,]+)')),
+        ):
+            registro[campo] = None
+            for padrao in padroes:
+                m = re.search(padrao, bloco, re.IGNORECASE)
+                if m:
+                    registro[campo] = _valor_antigo(m.group(1))
+                    break
+        registro["horas_extras"] = sum(
+            int(h) + int(m) / 60 for h, m in re.findall(r"HORA EXTRA\s+\d+%\s+(\d{1,2}):(\d{2})", bloco, re.IGNORECASE)
+        )
+        resultado.append(registro)
+    return resultado
+
+
+def medir(nome, funcao, textos, repeticoes):
+    melhor = None
+    funcionarios = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcionarios = sum(len(funcao(texto)) for texto in textos)
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    mb = sum(len(t.encode('utf-8')) for t in textos) / (1024 * 1024)
+    print(f"  {nome:<28} {melhor * 1000:8.1f} ms  {mb / melhor:7.2f} MB/s  "
+          f"{funcionarios / melhor:9.0f} funcionários/s  ({funcionarios} funcionários)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pasta', default=str(PASTA_PADRAO))
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    arquivos = sorted(Path(args.pasta).glob('*.json'))
+    textos = []
+    for arquivo in arquivos:
+        with open(arquivo, encoding='utf-8') as f:
+            textos.append(json.load(f).get('texto_completo') or '')
+    if not textos:
+        print(f"Nenhum JSON em {args.pasta}")
+        return
+
+    print(f"{len(textos)} JSON(s), {sum(map(len, textos)) / 1024:.0f} KiB de texto (melhor de {args.repeticoes})")
+    medir("antigo (re.search por campo)", extrair_antigo, textos, args.repeticoes)
+    medir("folha_iob (passada única)", extrair_funcionarios, textos, args.repeticoes)
+
+
+if __name__ == '__main__':
+    main()
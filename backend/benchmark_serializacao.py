@@ -0,0 +1,118 @@
+"""
+Microbenchmark da serialização das leituras de tabela.
+
+Compara o caminho antigo do endpoint (sqlite3.Row -> row_to_dict -> jsonify, que ordena as
+chaves) com o serializador de serializer.py (tuplas -> bytes), com e sem orjson.
+
+Uso:
+    python benchmark_serializacao.py [tabela] [--repeticoes N] [--multiplicar N]
+
+O banco é aberto somente leitura. --multiplicar repete as linhas em memória para
+simular tabelas maiores.
+"""
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+from flask import Flask, jsonify
+
+import serializer
+from serializer import RowSerializer
+
+DB_PATH = Path(__file__).parent / 'database.db'
+
+
+def row_to_dict_antigo(row):
+    """Cópia do row_to_dict anterior de app.py (antes do serializador)"""
+    result = {}
+    for key in row.keys():
+        value = row[key]
+        # Converter None para null (JSON)
+        if value is None:
+            result[key] = None
+        # Manter strings, números e booleanos como estão
+        elif isinstance(value, (str, int, float, bool)):
+            result[key] = value
+        # Converter bytes para string (se necessário)
+        elif isinstance(value, bytes):
+            result[key] = value.decode('utf-8', errors='ignore')
+        # Converter outros tipos para string
+        else:
+            result[key] = str(value)
+    return result
+
+
+def carregar(table_name, row_factory):
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    conn.row_factory = row_factory
+    try:
+        cursor = conn.execute(f'SELECT rowid, * FROM "{table_name}"')
+        names = [d[0] for d in cursor.description]
+        return names, cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def medir(nome, funcao, repeticoes):
+    melhor = None
+    tamanho = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        tamanho = len(funcao())
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    print(f"  {nome:<32} {melhor * 1000:9.1f} ms  {tamanho / 1024:9.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('tabela', nargs='?', default='absenteísmo')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--multiplicar', type=int, default=20)
+    args = parser.parse_args()
+
+    _, linhas_row = carregar(args.tabela, sqlite3.Row)
+    names, linhas = carregar(args.tabela, None)
+    linhas_row = linhas_row * args.multiplicar
+    linhas = linhas * args.multiplicar
+
+    keep = [i for i, name in enumerate(names) if name not in names[:i]]
+    columns = [names[i] for i in keep]
+
+    # O endpoint antigo respondia com jsonify (provider JSON padrão do Flask, sort_keys=True)
+    app = Flask(__name__)
+
+    def antigo():
+        data = [row_to_dict_antigo(r) for r in linhas_row]
+        with app.app_context():
+            return jsonify({
+                "table": args.tabela,
+                "count": len(data),
+                "data": data,
+                "filters": {"mes": None, "ano": None},
+            }).get_data()
+
+    def objetos():
+        return b'{"data":[' + RowSerializer(columns, keep).objects(linhas) + b']}'
+
+    def arrays():
+        return b'{"data":[' + RowSerializer(columns, keep).arrays(linhas) + b']}'
+
+    print(f"Tabela {args.tabela}: {len(linhas)} linhas, {len(columns)} colunas "
+          f"(melhor de {args.repeticoes})")
+    medir("antigo (row_to_dict + jsonify)", antigo, args.repeticoes)
+
+    backends = [('stdlib', False)]
+    if serializer.ORJSON_AVAILABLE:
+        backends.append(('orjson', True))
+    for nome, usar_orjson in backends:
+        serializer.ORJSON_AVAILABLE = usar_orjson
+        medir(f"{nome}: format=objects", objetos, args.repeticoes)
+        medir(f"{nome}: format=rows", arrays, args.repeticoes)
+    if len(backends) == 1:
+        print("  (orjson não instalado: pip install orjson para comparar)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Classificação barata das páginas dos PDFs de folha, antes da extração do texto.
+
+O tipo de cada página sai dos caracteres crus do layout (PDF/extracao_paginas.amostra_pagina),
+sem montar palavras e linhas, que é a parte cara de extract_text(): espelho de ponto, bloco
+de funcionário da folha IOB, totais da folha ou outra (capa, resumo, página em branco).
+Com um ClassificadorPaginas, extrair_paginas() só extrai o texto das páginas dos tipos
+pedidos; as demais ficam com texto "".
+"""
+from collections import Counter
+
+PONTO = 'ponto'
+FUNCIONARIO = 'funcionario'
+TOTAIS = 'totais'
+OUTRA = 'outra'
+TIPOS = (PONTO, FUNCIONARIO, TOTAIS, OUTRA)
+
+# Rótulos procurados na amostra, que vem sem espaços
+_ROTULOS_PONTO = ('Empregado:', 'CPF:', 'Período:')
+_ROTULO_FUNCIONARIO = 'Funcionário:'
+# Linhas do fim de um bloco de funcionário, que pode continuar no topo da página seguinte
+_ROTULOS_BLOCO = (_ROTULO_FUNCIONARIO, 'TotaldeVencimentos:', 'LíquidoaReceber:', 'ValordoFGTS:')
+_ROTULOS_TOTAIS = ('TOTALIZAÇÃODAFOLHA', 'TOTALGERAL')
+
+
+def classificar_pagina(amostra, contexto):
+    """
+    Tipo da página (um de TIPOS) a partir dos seus caracteres sem espaços.
+
+    A página em que a totalização da folha IOB começa é de funcionário se ainda traz, antes
+    dela, o fim do último bloco. contexto: dict compartilhado pelas páginas seguintes do
+    mesmo PDF; depois que a totalização começa, as páginas sem bloco de funcionário são a
+    continuação dos totais (bases de cálculo, tributos, total geral).
+    """
+    if not amostra:
+        return OUTRA
+    if all(rotulo in amostra for rotulo in _ROTULOS_PONTO):
+        return PONTO
+    if _ROTULO_FUNCIONARIO in amostra:
+        tipo = FUNCIONARIO
+    elif contexto.get('totais'):
+        tipo = TOTAIS
+    else:
+        inicio_totais = [amostra.find(rotulo) for rotulo in _ROTULOS_TOTAIS if rotulo in amostra]
+        antes = amostra[:min(inicio_totais)] if inicio_totais else amostra
+        if any(rotulo in antes for rotulo in _ROTULOS_BLOCO):
+            tipo = FUNCIONARIO
+        else:
+            tipo = TOTAIS if inicio_totais else OUTRA
+    if any(rotulo in amostra for rotulo in _ROTULOS_TOTAIS):
+        contexto['totais'] = True
+    return tipo
+
+
+class ClassificadorPaginas:
+    """Filtro para extracao_paginas.extrair_paginas(): só as páginas dos tipos relevantes são extraídas"""
+
+    def __init__(self, *relevantes):
+        self.relevantes = frozenset(relevantes)
+        # Entra na chave do cache, junto com os tipos extraídos
+        self.nome = 'tipos2-' + '+'.join(sorted(self.relevantes))
+
+    def classificar(self, amostra, contexto):
+        return classificar_pagina(amostra, contexto)
+
+
+def contar_tipos(paginas):
+    """{tipo: páginas} na ordem de TIPOS, só com os tipos presentes"""
+    contagem = Counter(pagina.get('tipo', OUTRA) for pagina in paginas)
+    return {tipo: contagem[tipo] for tipo in TIPOS if contagem[tipo]}
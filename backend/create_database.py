@@ -5,6 +5,8 @@ Script para criar o banco de dados SQLite com as tabelas necessárias
 import sqlite3
 from pathlib import Path
 
+from migrations import apply_migrations
+
 # Caminho do banco de dados
 BASE_DIR = Path(__file__).parent.absolute()
 DB_FILE = BASE_DIR / "database.db"
@@ -19,25 +21,6 @@ def create_database():
     cursor = conn.cursor()
     
     try:
-        # Criar tabela absenteísmo
-        print("  ✓ Criando tabela 'absenteísmo'...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS absenteísmo (
-                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
-                CPF TEXT,
-                Nome TEXT,
-                Matricula TEXT,
-                Mês TEXT,
-                Ano INTEGER,
-                Horas_Extras REAL,
-                Custo_Horas_Extras REAL,
-                Faltas REAL,
-                Abonos REAL,
-                Salário REAL,
-                Valor_Hora_Extra REAL
-            )
-        """)
-        
         # Criar tabela base_kpi
         print("  ✓ Criando tabela 'base_kpi'...")
         cursor.execute("""
@@ -92,33 +75,11 @@ def create_database():
             )
         """)
         
-        # Criar tabela avaliacoes (sistema de avaliações por link)
-        print("  ✓ Criando tabela 'avaliacoes'...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS avaliacoes (
-                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
-                token TEXT UNIQUE NOT NULL,
-                colaborador_id TEXT,
-                colaborador_nome TEXT,
-                gestor_nome TEXT,
-                gestor_email TEXT,
-                periodo TEXT,
-                data_criacao TEXT,
-                data_preenchimento TEXT,
-                status TEXT DEFAULT 'pendente',
-                Assiduidade REAL,
-                Segurança REAL,
-                Produtividade REAL,
-                Disciplina REAL,
-                Trabalho_em_equipe REAL,
-                Colaboração REAL,
-                Avaliação_do_Funcionário REAL,
-                Pontos_de_Melhoria TEXT,
-                Observações TEXT
-            )
-        """)
-        
         conn.commit()
+        
+        # Tabelas usuarios/absenteísmo/avaliacoes, colunas de período, índices e triggers
+        print("  ✓ Aplicando migrações (usuarios, absenteísmo, avaliacoes, índices e triggers)...")
+        apply_migrations(conn)
         print(f"\n✅ Banco de dados criado com sucesso em: {DB_FILE}")
         
         # Mostrar tabelas criadas
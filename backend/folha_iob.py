@@ -0,0 +1,94 @@
+"""
+Parser do texto da folha mensal IOB (blocos "Funcionário: N - NOME Adm: ... [Dem: ...] Função: ...").
+
+Usado pelo upload da folha IOB (app.py) e pela importação dos JSONs extraídos
+(import_pdf_jsons_to_db.py). Um único regex compilado com um grupo nomeado por campo
+percorre o texto uma vez; cada ocorrência é atribuída ao funcionário do bloco atual.
+A seção de totalização no fim do documento encerra o último bloco, para que os totais
+gerais não sejam lidos como valores do último funcionário.
+"""
+import re
+
+# Campos monetários de cada funcionário (primeira ocorrência no bloco)
+CAMPOS_VALOR = ('salario_base', 'vencimentos', 'descontos', 'liquido', 'fgts', 'inss', 'irrf')
+
+_VALOR = r'[\d.,]+'
+
+# Os rótulos seguem a grafia exata do relatório IOB (sem IGNORECASE). O lookahead com as
+# iniciais dos rótulos descarta rápido as posições que não podem começar nenhum campo.
+_PADRAO = re.compile(
+    r'(?=[FSTVLDH])(?:'
+    r'(?P<funcionario>^Funcionário:[ \t]*(?P<matricula>\d+)[ \t]*-[ \t]*(?P<nome>[^\n]+?)'
+    r'(?:[ \t]+Adm:[ \t]*(?P<adm>\d{2}/\d{2}/\d{4}))?(?:[ \t]+(?:Dem|Afastado):[^\n]*?)?'
+    r'(?:[ \t]+Função:[ \t]*(?P<funcao>[^\n]*?))?[ \t]*$)'
+    r'|Salário Base:\s*(?P<salario_base>' + _VALOR + r')'
+    r'|Total de Vencimentos:\s*(?P<vencimentos>' + _VALOR + r')'
+    r'|Total de Descontos:\s*(?P<descontos>' + _VALOR + r')'
+    r'|Líquido a Receber:\s*(?P<liquido>' + _VALOR + r')'
+    r'|Valor do FGTS:\s*(?P<fgts>' + _VALOR + r')'
+    # "00080 DESCONTO INSS 9,1355% 339,96"; a referência pode ser "INF" (rescisões) ou faltar
+    r'|DESCONTO INSS[ \t]+(?:(?:[\d.,]+%|INF)[ \t]+)?(?P<inss>' + _VALOR + r')'
+    r'|DESCONTO I\.?R\.?R\.?F\.?[ \t]+(?:(?:[\d.,]+%|INF)[ \t]+)?(?P<irrf>' + _VALOR + r')'
+    # "00013 HORA EXTRA 100% 06:30 196,51": soma todas as linhas de hora extra
+    r'|HORA EXTRA[ \t]+\d+%[ \t]+(?P<he_horas>\d{1,3}):(?P<he_minutos>\d{2})'
+    # "00206 FALTAS INJUSTIFICADAS 1 77,48" ou "... 41,00 2.716,47": a referência (dias) pode ser
+    # decimal quando vem seguida do valor; um valor sozinho ("... 2.716,47") não tem referência
+    r'|FALTAS INJUSTIFICADAS[ \t]+(?P<faltas>\d+(?:,\d+)?(?=[ \t]+\d[\d.]*,\d{2})|\d+(?![\d.,]))'
+    r'|(?P<fim>^(?:TOTALIZAÇÃO DA FOLHA|TOTAL GERAL)\b))',
+    re.MULTILINE,
+)
+
+
+def valor_br(texto):
+    """Converte um valor no formato brasileiro (1.234,56) para float, ou None se inválido"""
+    try:
+        return float(texto.replace('.', '').replace(',', '.'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _novo_funcionario(match):
+    registro = {
+        'matricula': match.group('matricula'),
+        'nome': match.group('nome').strip(),
+        'adm': match.group('adm') or '',
+        'funcao': (match.group('funcao') or '').strip(),
+        'horas_extras': 0.0,
+        'faltas': 0.0,
+    }
+    registro.update(dict.fromkeys(CAMPOS_VALOR))
+    return registro
+
+
+def iterar_funcionarios(texto):
+    """
+    Percorre o texto da folha e gera um dict por funcionário, na ordem do documento:
+    matricula, nome, adm, funcao, horas_extras (soma das linhas de hora extra, em horas),
+    faltas (dias) e os CAMPOS_VALOR (float, ou None quando o campo não aparece no bloco).
+    """
+    atual = None
+    for match in _PADRAO.finditer(texto):
+        campo = match.lastgroup
+        if campo == 'funcionario':
+            if atual is not None:
+                yield atual
+            atual = _novo_funcionario(match)
+        elif atual is None:
+            continue  # Cabeçalho antes do primeiro funcionário
+        elif campo == 'fim':
+            yield atual
+            atual = None
+        elif campo == 'he_minutos':
+            atual['horas_extras'] += int(match.group('he_horas')) + int(match.group('he_minutos')) / 60
+        elif campo == 'faltas':
+            if not atual['faltas']:
+                atual['faltas'] = valor_br(match.group('faltas'))
+        elif atual[campo] is None:
+            atual[campo] = valor_br(match.group(campo))
+    if atual is not None:
+        yield atual
+
+
+def extrair_funcionarios(texto):
+    """Lista dos registros de iterar_funcionarios()"""
+    return list(iterar_funcionarios(texto))
@@ -0,0 +1,98 @@
+"""
+Leitura das páginas da folha de ponto (um espelho de ponto por colaborador).
+
+Da página só interessam o cabeçalho (Empregado, CPF, Período) e a faixa de totais (TOTALS,
+Faltantes, Abonadas). RecorteFolhaPonto localiza essas duas faixas uma vez, na primeira
+página do layout, e nas seguintes extrai apenas o texto delas (PDF/extracao_paginas.py).
+A página é lida inteira quando a conferência falha: cabeçalho incompleto na faixa ou algum
+rótulo de totais fora dela (layout diferente, linha a mais na tabela).
+"""
+import re
+from collections import namedtuple
+
+from PDF.extracao_paginas import texto_faixas
+
+RE_CPF = re.compile(r'CPF:\s*(\d{3}\.\d{3}\.\d{3}-\d{2})')
+RE_EMPREGADO = re.compile(r'Empregado:\s*([^\n]+)')
+RE_PERIODO = re.compile(r'Período:\s*(\d{2}/\d{2}/\d{4})\s*à\s*(\d{2}/\d{2}/\d{4})')
+RE_TOTAIS = re.compile(r'TOTALS.*?(\d{1,2}):(\d{2})', re.DOTALL)
+RE_FALTAS = re.compile(r'Faltantes.*?(\d{1,2}):(\d{2})')
+RE_ABONOS = re.compile(r'Abonadas.*?(\d{1,2}):(\d{2})')
+
+ROTULOS_CABECALHO = ('Empregado:', 'CPF:', 'Período:')
+ROTULOS_TOTAIS = ('TOTALS', 'Faltantes', 'Abonadas')
+
+# Linhas acima de TOTALS incluídas na faixa, para meses com menos dias na tabela
+FOLGA_LINHAS_TOTAIS = 3
+
+# Faixas (top, bottom), em pontos a partir do topo da página
+TemplateFolhaPonto = namedtuple('TemplateFolhaPonto', 'cabecalho totais')
+
+
+def _horas(match):
+    return int(match.group(1)) + int(match.group(2)) / 60
+
+
+def ler_pagina(texto):
+    """
+    Dados do colaborador numa página (inteira ou recortada) da folha de ponto: cpf (só
+    dígitos), nome, data_inicio, data_fim (dd/mm/aaaa), horas_extras, faltas e abonos (horas).
+    None quando a página não tem o cabeçalho completo (capa, resumo, página em branco).
+    """
+    cpf = RE_CPF.search(texto)
+    nome = RE_EMPREGADO.search(texto)
+    periodo = RE_PERIODO.search(texto)
+    if not (cpf and nome and periodo):
+        return None
+    totais = RE_TOTAIS.search(texto)
+    return {
+        'cpf': cpf.group(1).replace('.', '').replace('-', ''),
+        'nome': nome.group(1).strip(),
+        'data_inicio': periodo.group(1),
+        'data_fim': periodo.group(2),
+        'horas_extras': _horas(totais) if totais else 0,
+        'faltas': sum(_horas(m) for m in RE_FALTAS.finditer(texto)),
+        'abonos': sum(_horas(m) for m in RE_ABONOS.finditer(texto)),
+    }
+
+
+class RecorteFolhaPonto:
+    """Recorte do cabeçalho e da faixa de totais para extracao_paginas.extrair_paginas()"""
+
+    nome = 'folha-ponto-1'  # Entra na chave do cache: incrementar ao mudar o recorte
+
+    def reconhece(self, texto):
+        return bool(RE_CPF.search(texto) and RE_EMPREGADO.search(texto) and RE_PERIODO.search(texto))
+
+    def localizar(self, page):
+        """Template a partir das posições dos rótulos na página, ou None se não der para recortar"""
+        palavras = page.extract_words()
+        cabecalho = [p for p in palavras if p['text'].startswith(ROTULOS_CABECALHO)]
+        totais = [p for p in palavras if p['text'].startswith(ROTULOS_TOTAIS)]
+        if (not all(any(p['text'].startswith(r) for p in cabecalho) for r in ROTULOS_CABECALHO)
+                or not any(p['text'].startswith('TOTALS') for p in totais)):
+            return None
+
+        # Cabeçalho: do topo até o meio do espaço entre a última linha com rótulo e a seguinte
+        base = max(p['bottom'] for p in cabecalho)
+        abaixo = [p['top'] for p in palavras if p['top'] >= base]
+        fim_cabecalho = (base + min(abaixo)) / 2 if abaixo else page.height
+
+        # Totais: da linha TOTALS (menos a folga) até o fim da página. Faltantes/Abonadas acima
+        # disso (no meio da tabela) tornariam a faixa quase a página inteira: não recorta
+        linha_totais = min((p for p in totais if p['text'].startswith('TOTALS')), key=lambda p: p['top'])
+        altura_linha = linha_totais['bottom'] - linha_totais['top']
+        inicio_totais = max(fim_cabecalho, linha_totais['top'] - FOLGA_LINHAS_TOTAIS * altura_linha * 1.5)
+        if inicio_totais >= linha_totais['top'] or any(p['top'] < inicio_totais for p in totais):
+            return None
+        return TemplateFolhaPonto((0, fim_cabecalho), (inicio_totais, page.height))
+
+    def extrair(self, page, template):
+        """Texto do cabeçalho e dos totais, ou None se o template não confere com a página"""
+        (cabecalho, totais), bruto = texto_faixas(page, template)
+        if not self.reconhece(cabecalho):
+            return None
+        # Todo rótulo de totais da página precisa estar na faixa (ler_pagina soma todos)
+        if any(totais.count(rotulo) != bruto.count(rotulo) for rotulo in ROTULOS_TOTAIS):
+            return None
+        return f"{cabecalho}\n{totais}"
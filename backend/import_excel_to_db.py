@@ -9,6 +9,8 @@ from pathlib import Path
 from datetime import timedelta, datetime
 import numpy as np
 
+from migrations import apply_migrations
+
 # Caminhos
 # PythonAnywhere: ajustar caminhos conforme necessário
 BASE_DIR = Path(__file__).parent
@@ -118,6 +120,9 @@ def import_excel_to_sqlite():
             print(f"  ✓ Tabela '{table_name}' criada com sucesso!")
         
         conn.commit()
+        
+        # Tabelas recriadas pelo pandas perdem colunas de período, índices e triggers
+        apply_migrations(conn)
         print(f"\n✓ Importação concluída! Banco de dados criado em: {DB_FILE}")
         
         # Mostrar resumo
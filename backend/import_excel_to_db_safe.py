@@ -9,6 +9,8 @@ from pathlib import Path
 from datetime import timedelta, datetime
 import numpy as np
 
+from migrations import apply_migrations
+
 # Caminhos
 BASE_DIR = Path(__file__).parent
 EXCEL_FILE = BASE_DIR / "template_padrao (1).xlsx"
@@ -140,6 +142,9 @@ def import_excel_to_sqlite_safe():
         
         conn.commit()
         
+        # Tabelas recriadas pelo pandas perdem colunas de período, índices e triggers
+        apply_migrations(conn)
+        
         # Resumo
         print(f"\n{'='*60}")
         print(f"✅ Importação concluída!")
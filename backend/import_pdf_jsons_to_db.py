@@ -15,6 +15,9 @@ import re
 import sys
 from pathlib import Path
 
+from folha_iob import iterar_funcionarios
+from migrations import NATURAL_KEYS, apply_migrations, natural_key_upsert_sql
+
 # Encontrar backend e banco
 SCRIPT_DIR = Path(__file__).parent.resolve()
 if (SCRIPT_DIR / "database.db").exists():
@@ -64,54 +67,14 @@ def _extrair_periodo(texto):
 def _extrair_colaboradores(texto):
     """Extrai lista de colaboradores do texto (blocos Funcionário: N - NOME Adm: ...)."""
     resultado = []
-    # Split por "Funcionário: NNN - " mantendo o número e o resto do bloco
-    partes = re.split(r"Funcionário:\s*(\d+)\s*-\s*", texto)
-    for i in range(1, len(partes), 2):
-        if i + 1 >= len(partes):
-            break
-        matricula = (partes[i] or "").strip()
-        bloco = partes[i + 1] or ""
-        if not matricula.isdigit():
-            continue
-        # Nome até "Adm:" ou fim da linha
-        nome_match = re.search(r"^([^\n]+?)(?:\s+Adm:|\n)", bloco, re.MULTILINE)
-        nome = nome_match.group(1).strip() if nome_match else ""
-        if not nome:
+    for func in iterar_funcionarios(texto):
+        if not func["nome"]:
             continue
-        # Adm e Função
-        adm_match = re.search(r"Adm:\s*(\d{2}/\d{2}/\d{4})", bloco)
-        funcao_match = re.search(r"Função:\s*([^\n]+)", bloco)
-        adm = adm_match.group(1) if adm_match else ""
-        funcao = funcao_match.group(1).strip() if funcao_match else ""
-        # Salário Base
-        sal_match = re.search(r"Salário Base:\s*([\d.,]+)", bloco)
-        salario = _parse_valor(sal_match.group(1)) if sal_match else 0.0
-        # Líquido a Receber
-        liq_match = re.search(r"Líquido a Receber:\s*([\d.,]+)", bloco)
-        liquido = _parse_valor(liq_match.group(1)) if liq_match else 0.0
-        # Total de Vencimentos (folha mensal)
-        venc_match = re.search(r"Total de Vencimentos:\s*([\d.,]+)", bloco)
-        vencimentos = _parse_valor(venc_match.group(1)) if venc_match else liquido or salario
-        
-        # Extrair Horas Extras (padrões: "00013 HORA EXTRA 100% 08:03" ou "00009 HORA EXTRA 050% 08:00" ou "00220 HORA EXTRA 55% 01:00")
-        horas_extras = 0.0
-        horas_extra_matches = re.findall(r"HORA EXTRA\s+\d+%\s+(\d{1,2}):(\d{2})", bloco, re.IGNORECASE)
-        for horas_str, minutos_str in horas_extra_matches:
-            try:
-                horas = int(horas_str)
-                minutos = int(minutos_str)
-                horas_extras += horas + (minutos / 60.0)
-            except (ValueError, IndexError):
-                continue
-        
-        # Extrair Faltas (padrão: "00206 FALTAS INJUSTIFICADAS 3")
-        faltas = 0.0
-        faltas_match = re.search(r"FALTAS INJUSTIFICADAS\s+(\d+)", bloco, re.IGNORECASE)
-        if faltas_match:
-            try:
-                faltas = float(faltas_match.group(1))
-            except (ValueError, IndexError):
-                pass
+        salario = func["salario_base"] or 0.0
+        liquido = func["liquido"] or 0.0
+        # Total de Vencimentos (folha mensal); na folha de adiantamento não existe
+        vencimentos = func["vencimentos"] if func["vencimentos"] is not None else liquido or salario
+        horas_extras = func["horas_extras"]
         
         # Calcular valor da hora extra baseado no salário
         horas_mes = 220  # 44h semanais * 5 semanas
@@ -120,15 +83,15 @@ def _extrair_colaboradores(texto):
         custo_horas_extras = horas_extras * valor_hora_extra
         
         resultado.append({
-            "matricula": matricula,
-            "nome": nome,
-            "adm": adm,
-            "funcao": funcao,
+            "matricula": func["matricula"],
+            "nome": func["nome"],
+            "adm": func["adm"],
+            "funcao": func["funcao"],
             "salario": salario,
             "liquido": liquido,
             "vencimentos": vencimentos,
             "horas_extras": round(horas_extras, 2),
-            "faltas": faltas,
+            "faltas": func["faltas"],
             "custo_horas_extras": round(custo_horas_extras, 2),
             "valor_hora_extra": round(valor_hora_extra, 2),
         })
@@ -196,7 +159,8 @@ def run(pasta_extraidos, zerar_jornada=True, dry_run=False):
         print(f"Erro: pasta não encontrada: {pasta}", flush=True)
         return 1
 
-    jsons = sorted(pasta.glob("*.json"))
+    # manifest.json é o controle de extrair_todos.py, não um PDF extraído
+    jsons = sorted(p for p in pasta.glob("*.json") if p.name != "manifest.json")
     print(f"Pasta: {pasta} | JSONs: {len(jsons)}", flush=True)
     if not jsons:
         print(f"Nenhum JSON em: {pasta}", flush=True)
@@ -253,12 +217,8 @@ def run(pasta_extraidos, zerar_jornada=True, dry_run=False):
     conn = sqlite3.connect(str(DB_FILE))
     cursor = conn.cursor()
 
-    # Adicionar coluna Matricula se não existir
-    try:
-        cursor.execute("ALTER TABLE absenteísmo ADD COLUMN Matricula TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
+    # Migrações: coluna Matricula, colunas de período (preenchidas pelas triggers) etc.
+    apply_migrations(conn)
 
     if zerar_jornada:
         cursor.execute("DELETE FROM absenteísmo")
@@ -266,38 +226,28 @@ def run(pasta_extraidos, zerar_jornada=True, dry_run=False):
         conn.commit()
         print("Tabelas absenteísmo e base_kpi zeradas.")
 
-    # Inserir absenteísmo (com Matricula se a coluna existir)
+    # Inserir absenteísmo (com Matricula se a coluna existir). UPSERT na chave natural
+    # (migrations.NATURAL_KEYS): reimportar um período com --no-zerar atualiza as linhas
     cursor.execute("PRAGMA table_info(absenteísmo)")
     col_names = [r[1] for r in cursor.fetchall()]
     tem_matricula = "Matricula" in col_names
 
-    for r in registros_abs:
-        if tem_matricula:
-            cursor.execute(
-                """INSERT INTO absenteísmo (CPF, Nome, Matricula, Mês, Ano, Horas_Extras, Custo_Horas_Extras, Faltas, Abonos, Salário, Valor_Hora_Extra)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    r["cpf"], r["nome"], r["matricula"], r["mes"], r["ano"],
-                    r["horas_extras"], r["custo_horas_extras"], r["faltas"], r["abonos"],
-                    r["salario"], r["valor_hora_extra"],
-                ),
-            )
-        else:
-            cursor.execute(
-                """INSERT INTO absenteísmo (CPF, Nome, Mês, Ano, Horas_Extras, Custo_Horas_Extras, Faltas, Abonos, Salário, Valor_Hora_Extra)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    r["cpf"], r["nome"], r["mes"], r["ano"],
-                    r["horas_extras"], r["custo_horas_extras"], r["faltas"], r["abonos"],
-                    r["salario"], r["valor_hora_extra"],
-                ),
-            )
-
-    for r in registros_kpi:
-        cursor.execute(
-            "INSERT INTO base_kpi (KPI, Mês, Ano, Valor, Tipo) VALUES (?, ?, ?, ?, ?)",
-            (r[0], r[1], r[2], r[3], r[4]),
-        )
+    colunas_abs = ["CPF", "Nome", "Matricula", "Mês", "Ano", "Horas_Extras", "Custo_Horas_Extras",
+                   "Faltas", "Abonos", "Salário", "Valor_Hora_Extra"]
+    campos_abs = ["cpf", "nome", "matricula", "mes", "ano", "horas_extras", "custo_horas_extras",
+                  "faltas", "abonos", "salario", "valor_hora_extra"]
+    if not tem_matricula:
+        del colunas_abs[2], campos_abs[2]
+    chave_abs = NATURAL_KEYS["absenteísmo"][0]
+    cursor.executemany(
+        natural_key_upsert_sql("absenteísmo", colunas_abs, [c for c in colunas_abs if c not in chave_abs]),
+        [tuple(r[campo] for campo in campos_abs) for r in registros_abs],
+    )
+
+    cursor.executemany(
+        natural_key_upsert_sql("base_kpi", ["KPI", "Mês", "Ano", "Valor", "Tipo"], ["Valor", "Tipo"]),
+        registros_kpi,
+    )
 
     conn.commit()
     conn.close()
@@ -0,0 +1,70 @@
+"""
+Logging com níveis e tempo por etapa para os processamentos do backend (uploads de PDF, jobs).
+
+Configuração por variáveis de ambiente:
+  LOG_LEVEL     nível do log (default: INFO; DEBUG mostra o detalhe por etapa e por funcionário)
+  LOG_PDF_TEXT  1 para despejar no log (nível DEBUG) o texto extraído de cada página do PDF;
+                desligado por padrão, pois escreve o documento inteiro a cada upload
+"""
+import logging
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_PDF_TEXT = os.environ.get('LOG_PDF_TEXT', '').lower() in ('1', 'true', 'yes', 'sim')
+
+
+def configure_logging():
+    """Formato e nível do log raiz; não altera nada se o servidor (gunicorn, uWSGI) já configurou"""
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip('0').rstrip('.')
+    text = str(value)
+    return f'"{text}"' if not text or any(c.isspace() for c in text) else text
+
+
+def format_fields(fields):
+    """Campos no formato chave=valor (valores com espaço entre aspas), fácil de filtrar no log"""
+    return ' '.join(f"{name}={_format_value(value)}" for name, value in fields.items())
+
+
+class StageTimer:
+    """
+    Mede as etapas de uma operação e registra uma linha de resumo com os tempos:
+
+        timer = StageTimer(logger, 'folha-iob', arquivo='x.pdf')
+        with timer.stage('paginas'):
+            ...
+        timer.log(funcionarios=10)
+        # INFO app: folha-iob arquivo=x.pdf funcionarios=10 paginas_ms=812.4 total_ms=815.0
+
+    Os campos também vão em record.fields (extra do logging) para handlers estruturados.
+    """
+
+    def __init__(self, logger, operation, **fields):
+        self.logger = logger
+        self.operation = operation
+        self.fields = dict(fields)
+        self.timings = {}
+        self._start = perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = round((perf_counter() - start) * 1000, 1)
+            self.timings[f"{name}_ms"] = elapsed
+            self.logger.debug("%s etapa=%s duracao_ms=%s", self.operation, name, elapsed)
+
+    def log(self, level=logging.INFO, **fields):
+        """Registra o resumo (campos + tempo de cada etapa + total)"""
+        self.fields.update(fields)
+        summary = {**self.fields, **self.timings, 'total_ms': round((perf_counter() - self._start) * 1000, 1)}
+        self.logger.log(level, "%s %s", self.operation, format_fields(summary), extra={'fields': summary})
+        return summary
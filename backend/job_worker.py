@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Executa os jobs de upload enfileirados na tabela jobs (JOB_MODE=worker).
+
+Para servidores em que o processo web não tem threads (uWSGI sem enable-threads, como as
+web apps do PythonAnywhere): com JOB_MODE=worker o app só registra o job, e este processo,
+rodando à parte (ex.: tarefa always-on), executa a fila um job por vez. Os PDFs enviados
+ficam em UPLOAD_DIR, que precisa ser uma pasta vista pelos dois processos.
+
+Uso:
+  python job_worker.py
+  python job_worker.py --uma-vez    # processa a fila e termina
+"""
+import argparse
+import sys
+
+from app import job_runner
+from jobs import JOB_POLL_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa os jobs de upload enfileirados (JOB_MODE=worker)")
+    parser.add_argument("--uma-vez", action="store_true", help="Processa os jobs da fila e termina")
+    parser.add_argument("--intervalo", type=float, default=JOB_POLL_SECONDS,
+                        help=f"Segundos entre consultas à fila vazia (default: {JOB_POLL_SECONDS})")
+    args = parser.parse_args()
+    try:
+        job_runner.run_worker(once=args.uma_vez, poll_seconds=args.intervalo)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
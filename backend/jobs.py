@@ -0,0 +1,240 @@
+"""
+Fila de jobs em segundo plano para processamentos demorados (uploads de PDF).
+
+Os jobs rodam num pool de threads do próprio processo, sem broker externo. O estado
+(status, progresso por página, resultado) fica na tabela jobs do SQLite, para que
+GET /api/jobs/<id> responda em qualquer worker do servidor WSGI.
+
+Servidores sem threads no processo web (uWSGI sem enable-threads, como o PythonAnywhere)
+usam JOB_MODE=worker: o app só registra o job (com os argumentos) e um processo à parte,
+job_worker.py, executa a fila. Em JOB_MODE=thread sem threads disponíveis o submit falha
+na hora, em vez de deixar o job parado em queued.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from migrations import JOBS_TABLE
+from instrumentation import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Threads processando jobs em cada processo do servidor
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# Jobs terminados há mais tempo que isso são apagados
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+# thread: pool de threads no processo web; worker: fila executada por job_worker.py
+JOB_MODES = ('thread', 'worker')
+JOB_MODE = os.environ.get('JOB_MODE', 'thread').strip().lower()
+# Intervalo entre as consultas à fila quando o job_worker.py não tem job
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+
+THREADS_INDISPONIVEIS = (
+    "Threads desativadas no servidor (uWSGI sem enable-threads): os jobs nunca rodariam. "
+    "Ative enable-threads ou use JOB_MODE=worker com o job_worker.py"
+)
+
+# O pid do job só é conferido na máquina que o executa (o job_worker.py pode rodar em outra)
+_HOST = socket.gethostname()
+
+
+class JobError(Exception):
+    """Falha esperada de um job (ex.: nenhum dado extraído): vira o campo error, sem traceback"""
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def threads_disponiveis():
+    """
+    False quando o app roda no uWSGI sem threads (sem enable-threads e sem threads > 1):
+    threads criadas pelo app não executam fora das requisições.
+    """
+    try:
+        import uwsgi
+    except ImportError:
+        return True
+    opt = getattr(uwsgi, 'opt', {})
+    if opt.get('enable-threads'):
+        return True
+    try:
+        return int(opt.get('threads') or 0) > 1
+    except (TypeError, ValueError):
+        return False
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Existe, mas pertence a outro usuário
+    return True
+
+
+class JobRunner:
+    """
+    Executa funções em segundo plano e grava o estado na tabela jobs.
+
+    connect: função que devolve a conexão SQLite da thread atual.
+    Cada tipo de job é associado a uma função com register(). A função recebe os
+    argumentos de submit() (serializáveis em JSON, pois ficam na tabela para o
+    job_worker.py) mais progresso(pagina, total) e devolve o resultado (serializável em JSON).
+    """
+
+    def __init__(self, connect, max_workers=JOB_WORKERS, mode=JOB_MODE):
+        if mode not in JOB_MODES:
+            raise ValueError(f"JOB_MODE inválido: {mode!r} (use um de {JOB_MODES})")
+        self._connect = connect
+        self._max_workers = max_workers
+        self.mode = mode
+        self._funcs = {}
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        if mode == 'thread' and not threads_disponiveis():
+            logger.error("jobs: %s", THREADS_INDISPONIVEIS)
+
+    def register(self, tipo, func):
+        """Associa um tipo de job à função que o executa"""
+        self._funcs[tipo] = func
+
+    def _get_executor(self):
+        # Criado sob demanda e recriado após fork (servidores que pré-carregam o app)
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='job')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def submit(self, tipo, arquivo, *args):
+        """
+        Registra o job como queued e retorna o id. Em JOB_MODE=thread agenda a execução no
+        pool; em JOB_MODE=worker o job fica na tabela para o job_worker.py.
+        Levanta JobError se o pool não puder executar (threads desativadas no servidor).
+        """
+        func = self._funcs[tipo]
+        threads = self.mode == 'thread'
+        if threads and not threads_disponiveis():
+            raise JobError(THREADS_INDISPONIVEIS)
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        self._purge(conn)
+        conn.execute(
+            f"INSERT INTO {JOBS_TABLE} (id, tipo, arquivo, status, pid, host, args, created_at) "
+            f"VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, tipo, arquivo, os.getpid() if threads else None, _HOST if threads else None,
+             json.dumps(args), _now()),
+        )
+        conn.commit()
+        if threads:
+            try:
+                self._get_executor().submit(self._run, job_id, func, args)
+            except Exception as e:
+                self._update(conn, job_id, status='error', error=str(e), finished_at=_now())
+                raise
+        return job_id
+
+    def _update(self, conn, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn.execute(f"UPDATE {JOBS_TABLE} SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+    def _run(self, job_id, func, args):
+        conn = self._connect()
+        timer = StageTimer(logger, 'job', id=job_id)
+        try:
+            self._update(conn, job_id, status='running', pid=os.getpid(), host=_HOST, started_at=_now())
+
+            def progresso(pagina, total):
+                self._update(conn, job_id, paginas_processadas=pagina, total_paginas=total)
+
+            with timer.stage('execucao'):
+                resultado = func(*args, progresso=progresso)
+            self._update(conn, job_id, status='done', resultado=json.dumps(resultado, default=str), finished_at=_now())
+            timer.log(status='done')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if isinstance(e, JobError):
+                timer.log(logging.WARNING, status='error', error=str(e))
+            else:
+                logger.exception("job %s falhou", job_id)
+            self._update(conn, job_id, status='error', error=str(e), finished_at=_now())
+
+    def _claim(self, conn):
+        """Marca o job queued mais antigo como running neste processo. Retorna (id, tipo, args) ou None."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT id, tipo, args FROM {JOBS_TABLE} WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    f"UPDATE {JOBS_TABLE} SET status = 'running', pid = ?, host = ?, started_at = ? WHERE id = ?",
+                    (os.getpid(), _HOST, _now(), row[0]),
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return tuple(row) if row is not None else None
+
+    def run_worker(self, once=False, poll_seconds=JOB_POLL_SECONDS):
+        """
+        Executa os jobs queued da tabela, um por vez (processo do job_worker.py).
+        once: termina quando a fila estiver vazia, em vez de esperar novos jobs.
+        """
+        conn = self._connect()
+        while True:
+            job = self._claim(conn)
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll_seconds)
+                continue
+            job_id, tipo, args = job
+            func = self._funcs.get(tipo)
+            if func is None:
+                logger.error("job %s: tipo sem função registrada: %s", job_id, tipo)
+                self._update(conn, job_id, status='error', error=f"Tipo de job desconhecido: {tipo}",
+                             finished_at=_now())
+                continue
+            self._run(job_id, func, tuple(json.loads(args)) if args else ())
+
+    def get(self, job_id):
+        """Estado do job como dict, ou None se não existir"""
+        conn = self._connect()
+        row = conn.execute(
+            f"SELECT id, tipo, arquivo, status, pid, host, paginas_processadas, total_paginas, resultado, error, "
+            f"created_at, started_at, finished_at FROM {JOBS_TABLE} WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ('id', 'tipo', 'arquivo', 'status', 'pid', 'host', 'paginas_processadas', 'total_paginas', 'resultado',
+             'error', 'created_at', 'started_at', 'finished_at'),
+            tuple(row),
+        ))
+        pid = job.pop('pid')
+        host = job.pop('host')
+        if (job['status'] in ('queued', 'running') and pid and host in (None, _HOST)
+                and not _pid_alive(pid)):
+            # O processo que executava o job foi encerrado (deploy, reinício do worker)
+            job['status'] = 'error'
+            job['error'] = "Job interrompido: o processo do servidor foi encerrado"
+        job['resultado'] = json.loads(job['resultado']) if job['resultado'] else None
+        return job
+
+    def _purge(self, conn):
+        limite = (datetime.now() - timedelta(days=JOB_RETENTION_DAYS)).isoformat(timespec='seconds')
+        conn.execute(f"DELETE FROM {JOBS_TABLE} WHERE finished_at IS NOT NULL AND finished_at < ?", (limite,))
@@ -0,0 +1,518 @@
+"""
+Migrações de schema do banco SQLite.
+
+São aplicadas uma vez na inicialização do app e pelos scripts de criação/importação;
+os handlers de requisição não fazem DDL.
+
+Há dois tipos de etapa:
+- migrações numeradas (MIGRATIONS), registradas na tabela schema_version e executadas
+  uma única vez por banco;
+- etapas de reconciliação (colunas obrigatórias, colunas de período, contadores, facets,
+  chaves naturais), idempotentes, porque os importadores recriam tabelas inteiras via
+  pandas. Só rodam quando o schema mudou desde a última aplicação: o valor de
+  PRAGMA schema_version ao final da última aplicação fica guardado em PRAGMA user_version.
+"""
+import logging
+import sqlite3
+from datetime import datetime
+
+from periodo import resolver_colunas_periodo, sql_periodo_mes, sql_periodo_ano
+
+logger = logging.getLogger(__name__)
+
+# Contador de alterações por tabela (usado no ETag das leituras)
+TABLE_VERSIONS_TABLE = 'table_versions'
+
+# Valores distintos de mês/ano por tabela (usado em /api/data/<tabela>/filters)
+FILTER_FACETS_TABLE = 'filter_facets'
+
+# Migrações numeradas já aplicadas no banco
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+# Jobs em segundo plano (uploads de PDF)
+JOBS_TABLE = 'jobs'
+
+# Tabelas de controle do app: não são expostas pelas rotas genéricas de tabela (/api/tables, /api/data)
+INTERNAL_TABLES = frozenset({TABLE_VERSIONS_TABLE, FILTER_FACETS_TABLE, SCHEMA_VERSION_TABLE, JOBS_TABLE})
+
+# Tabelas que nunca recebem colunas/triggers derivadas
+IGNORED_TABLES = {'usuarios', 'sqlite_sequence'} | INTERNAL_TABLES
+
+# Colunas que o app grava e que podem faltar em tabelas antigas ou recriadas pelos importadores
+REQUIRED_COLUMNS = {
+    'absenteísmo': (('Matricula', 'TEXT'), ('Salário', 'REAL'), ('Valor_Hora_Extra', 'REAL')),
+}
+
+# sort_key dos valores de mês não reconhecidos (ficam depois de Dezembro)
+FACET_SORT_UNKNOWN = 99
+
+# Chaves repetidas listadas no log quando a criação do índice da chave natural remove linhas
+NATURAL_KEY_LOG_SAMPLE = 10
+
+# Chaves naturais usadas nos uploads (UPSERT): tabela -> (colunas, colunas que precisam estar
+# preenchidas para a linha entrar no índice). Em absenteísmo só linhas com CPF entram na chave
+# (as importadas dos JSONs de PDF vêm sem CPF).
+NATURAL_KEYS = {
+    'absenteísmo': (('CPF', 'Mês', 'Ano'), ('CPF',)),
+    'base_kpi': (('KPI', 'Mês', 'Ano'), ()),
+}
+
+
+def quote_identifier(name):
+    """Coloca um nome de tabela/coluna entre aspas duplas para uso em SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _quote_literal(value):
+    """Literal de texto SQL (para uso dentro do corpo de triggers, onde não há parâmetros)"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _user_tables(conn):
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    return [row[0] for row in rows if row[0] not in IGNORED_TABLES]
+
+
+def _columns(conn, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})").fetchall()]
+
+
+def _trigger_exists(conn, trigger_name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='trigger' AND name = ?", (trigger_name,)
+    ).fetchone()
+    return row is not None
+
+
+def _migration_001_app_tables(conn):
+    """Tabelas usadas diretamente pelos endpoints (login, uploads e avaliações)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            senha_hash TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'admin',
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS absenteísmo (
+            rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+            CPF TEXT,
+            Nome TEXT,
+            Matricula TEXT,
+            Mês TEXT,
+            Ano INTEGER,
+            Horas_Extras REAL,
+            Custo_Horas_Extras REAL,
+            Faltas REAL,
+            Abonos REAL,
+            Salário REAL,
+            Valor_Hora_Extra REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS avaliacoes (
+            rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT UNIQUE NOT NULL,
+            colaborador_id TEXT,
+            colaborador_nome TEXT,
+            gestor_nome TEXT,
+            gestor_email TEXT,
+            periodo TEXT,
+            data_criacao TEXT,
+            data_preenchimento TEXT,
+            status TEXT DEFAULT 'pendente',
+            Assiduidade REAL,
+            Segurança REAL,
+            Produtividade REAL,
+            Disciplina REAL,
+            Trabalho_em_equipe REAL,
+            Colaboração REAL,
+            Avaliação_do_Funcionário REAL,
+            Pontos_de_Melhoria TEXT,
+            Observações TEXT
+        )
+    """)
+
+
+def _migration_002_jobs(conn):
+    """Estado dos jobs em segundo plano, visível para todos os workers do servidor"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {JOBS_TABLE} (
+            id TEXT PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            arquivo TEXT,
+            status TEXT NOT NULL,
+            pid INTEGER,
+            paginas_processadas INTEGER NOT NULL DEFAULT 0,
+            total_paginas INTEGER,
+            resultado TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{JOBS_TABLE}_finished ON {JOBS_TABLE} (finished_at)")
+
+
+def _migration_004_jobs_worker(conn):
+    """Argumentos e máquina do job, para a fila executada fora do processo web (job_worker.py)"""
+    columns = _columns(conn, JOBS_TABLE)
+    for column in ('args', 'host'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {JOBS_TABLE} ADD COLUMN {column} TEXT")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{JOBS_TABLE}_status ON {JOBS_TABLE} (status, created_at)")
+
+
+def _create_period_indexes(conn, table_name):
+    """Índices dos filtros de período: (ano, mês) e, para ?mes= sem ?ano=, (mês, ano)"""
+    table = quote_identifier(table_name)
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote_identifier(f'idx_{table_name}_periodo')} "
+        f"ON {table} (periodo_ano, periodo_mes)"
+    )
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote_identifier(f'idx_{table_name}_periodo_mes')} "
+        f"ON {table} (periodo_mes, periodo_ano)"
+    )
+
+
+def _migration_003_period_month_index(conn):
+    """Índice por mês nas tabelas que já têm as colunas de período (filtro só por ?mes=)"""
+    for table_name in _user_tables(conn):
+        if 'periodo_mes' in _columns(conn, table_name):
+            _create_period_indexes(conn, table_name)
+
+
+# (versão, descrição, função). Nunca altere uma migração já publicada: crie uma nova.
+MIGRATIONS = [
+    (1, "tabelas usuarios, absenteísmo e avaliacoes", _migration_001_app_tables),
+    (2, "tabela jobs (uploads em segundo plano)", _migration_002_jobs),
+    (3, "índice (periodo_mes, periodo_ano) para o filtro só por mês", _migration_003_period_month_index),
+    (4, "colunas args e host em jobs (fila do job_worker.py)", _migration_004_jobs_worker),
+]
+
+
+def apply_required_columns(conn):
+    """Adiciona as colunas de REQUIRED_COLUMNS que faltarem nas tabelas existentes"""
+    tables = set(_user_tables(conn))
+    for table_name, required in REQUIRED_COLUMNS.items():
+        if table_name not in tables:
+            continue
+        columns = _columns(conn, table_name)
+        for column, column_type in required:
+            if column not in columns:
+                conn.execute(
+                    f"ALTER TABLE {quote_identifier(table_name)} ADD COLUMN {quote_identifier(column)} {column_type}"
+                )
+
+
+def apply_period_columns(conn):
+    """
+    Adiciona as colunas canônicas periodo_ano/periodo_mes (INTEGER) às tabelas que têm
+    coluna de mês, preenche as linhas existentes e cria as triggers que as mantêm
+    atualizadas em INSERT/UPDATE, além dos índices compostos usados pelos filtros.
+    """
+    for table_name in _user_tables(conn):
+        columns = _columns(conn, table_name)
+        mes_col, ano_col = resolver_colunas_periodo(columns)
+        if not mes_col:
+            continue
+
+        table = quote_identifier(table_name)
+        mes_expr = sql_periodo_mes(quote_identifier(mes_col))
+        ano_expr = sql_periodo_ano(quote_identifier(mes_col), quote_identifier(ano_col) if ano_col else None)
+
+        needs_backfill = False
+        for col in ('periodo_ano', 'periodo_mes'):
+            if col not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} INTEGER")
+                needs_backfill = True
+
+        # As triggers usam NEW.<coluna> no lugar do nome da coluna
+        new_mes = sql_periodo_mes("NEW." + quote_identifier(mes_col))
+        new_ano = sql_periodo_ano(
+            "NEW." + quote_identifier(mes_col),
+            "NEW." + quote_identifier(ano_col) if ano_col else None,
+        )
+        set_clause = f"SET periodo_ano = {new_ano}, periodo_mes = {new_mes} WHERE rowid = NEW.rowid"
+        watched = ", ".join(quote_identifier(c) for c in dict.fromkeys(c for c in (mes_col, ano_col) if c))
+
+        trigger_ins = f"trg_{table_name}_periodo_ins"
+        if not _trigger_exists(conn, trigger_ins):
+            conn.execute(
+                f"CREATE TRIGGER {quote_identifier(trigger_ins)} AFTER INSERT ON {table} "
+                f"BEGIN UPDATE {table} {set_clause}; END"
+            )
+            needs_backfill = True
+
+        trigger_upd = f"trg_{table_name}_periodo_upd"
+        if not _trigger_exists(conn, trigger_upd):
+            conn.execute(
+                f"CREATE TRIGGER {quote_identifier(trigger_upd)} AFTER UPDATE OF {watched} ON {table} "
+                f"BEGIN UPDATE {table} {set_clause}; END"
+            )
+            needs_backfill = True
+
+        if needs_backfill:
+            conn.execute(f"UPDATE {table} SET periodo_ano = {ano_expr}, periodo_mes = {mes_expr}")
+
+        _create_period_indexes(conn, table_name)
+
+
+def apply_change_counters(conn):
+    """
+    Cria a tabela table_versions e, para cada tabela de dados, triggers que incrementam
+    o contador da tabela em qualquer INSERT/UPDATE/DELETE (inclusive vindos dos scripts
+    de importação, que usam sqlite3 direto).
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_VERSIONS_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table_name in _user_tables(conn):
+        table = quote_identifier(table_name)
+        conn.execute(
+            f"INSERT OR IGNORE INTO {TABLE_VERSIONS_TABLE} (table_name, version) VALUES (?, 0)",
+            (table_name,),
+        )
+        bump = (
+            f"UPDATE {TABLE_VERSIONS_TABLE} SET version = version + 1 "
+            f"WHERE table_name = {_quote_literal(table_name)}"
+        )
+        created = False
+        for event, suffix in (('INSERT', 'ins'), ('UPDATE', 'upd'), ('DELETE', 'del')):
+            trigger_name = f"trg_{table_name}_version_{suffix}"
+            if not _trigger_exists(conn, trigger_name):
+                conn.execute(
+                    f"CREATE TRIGGER {quote_identifier(trigger_name)} AFTER {event} ON {table} "
+                    f"BEGIN {bump}; END"
+                )
+                created = True
+        if created:
+            # Tabela nova ou recriada (ex.: pandas): os dados mudaram sem passar pelas triggers
+            conn.execute(bump)
+
+
+def _facet_sort_expr(col, is_mes):
+    """sort_key de um valor: número do mês (1-12) para a coluna de mês, o próprio ano para a de ano"""
+    if is_mes:
+        return f"COALESCE({sql_periodo_mes(col)}, {FACET_SORT_UNKNOWN})"
+    return f"CASE WHEN TRIM({col}) GLOB '[0-9]*' THEN CAST({col} AS INTEGER) END"
+
+
+def apply_filter_facets(conn):
+    """
+    Cria a tabela filter_facets com os valores distintos (e a contagem de linhas) das
+    colunas de mês e ano de cada tabela, mantida por triggers em INSERT/UPDATE/DELETE.
+    O endpoint de filtros lê os valores já ordenados, sem varrer a tabela de dados.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FILTER_FACETS_TABLE} (
+            table_name TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            value NOT NULL,
+            sort_key INTEGER,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, column_name, value)
+        )
+    """)
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{FILTER_FACETS_TABLE}_sort "
+        f"ON {FILTER_FACETS_TABLE} (table_name, column_name, sort_key, value)"
+    )
+
+    tables = _user_tables(conn)
+    placeholders = ", ".join("?" for _ in tables)
+    conn.execute(f"DELETE FROM {FILTER_FACETS_TABLE} WHERE table_name NOT IN ({placeholders})", tables)
+
+    for table_name in tables:
+        mes_col, ano_col = resolver_colunas_periodo(_columns(conn, table_name))
+        # A mesma coluna pode ser de mês e de ano ("Mês/Ano"): um facet só, ordenado pelo mês
+        facet_cols = {col: col == mes_col for col in (mes_col, ano_col) if col}
+        if not facet_cols:
+            continue
+
+        table = quote_identifier(table_name)
+        table_lit = _quote_literal(table_name)
+
+        def facet_add(col, is_mes):
+            value = "NEW." + quote_identifier(col)
+            key = f"table_name = {table_lit} AND column_name = {_quote_literal(col)} AND value = {value}"
+            return (
+                f"INSERT OR IGNORE INTO {FILTER_FACETS_TABLE} (table_name, column_name, value, sort_key) "
+                f"SELECT {table_lit}, {_quote_literal(col)}, {value}, {_facet_sort_expr(value, is_mes)} "
+                f"WHERE {value} IS NOT NULL AND {value} != ''; "
+                f"UPDATE {FILTER_FACETS_TABLE} SET row_count = row_count + 1 WHERE {key};"
+            )
+
+        def facet_remove(col):
+            value = "OLD." + quote_identifier(col)
+            key = f"table_name = {table_lit} AND column_name = {_quote_literal(col)} AND value = {value}"
+            return (
+                f"UPDATE {FILTER_FACETS_TABLE} SET row_count = row_count - 1 WHERE {key}; "
+                f"DELETE FROM {FILTER_FACETS_TABLE} WHERE {key} AND row_count <= 0;"
+            )
+
+        add_all = " ".join(facet_add(col, is_mes) for col, is_mes in facet_cols.items())
+        remove_all = " ".join(facet_remove(col) for col in facet_cols)
+        watched = ", ".join(quote_identifier(col) for col in facet_cols)
+        triggers = (
+            (f"trg_{table_name}_facets_ins", f"AFTER INSERT ON {table}", add_all),
+            (f"trg_{table_name}_facets_upd", f"AFTER UPDATE OF {watched} ON {table}", remove_all + " " + add_all),
+            (f"trg_{table_name}_facets_del", f"AFTER DELETE ON {table}", remove_all),
+        )
+
+        created = False
+        for trigger_name, event, body in triggers:
+            if not _trigger_exists(conn, trigger_name):
+                conn.execute(f"CREATE TRIGGER {quote_identifier(trigger_name)} {event} BEGIN {body} END")
+                created = True
+
+        if created:
+            # Triggers novas (tabela nova ou recriada): recalcula os valores a partir dos dados
+            conn.execute(f"DELETE FROM {FILTER_FACETS_TABLE} WHERE table_name = ?", (table_name,))
+            for col, is_mes in facet_cols.items():
+                quoted = quote_identifier(col)
+                conn.execute(
+                    f"INSERT INTO {FILTER_FACETS_TABLE} (table_name, column_name, value, sort_key, row_count) "
+                    f"SELECT ?, ?, {quoted}, {_facet_sort_expr(quoted, is_mes)}, COUNT(*) FROM {table} "
+                    f"WHERE {quoted} IS NOT NULL AND {quoted} != '' GROUP BY {quoted}",
+                    (table_name, col),
+                )
+
+
+def natural_key_index(table_name):
+    return f"idx_{table_name}_natural_key"
+
+
+def natural_key_where(table_name):
+    """Condição do índice parcial da chave natural (a mesma usada no ON CONFLICT), ou None"""
+    _, required = NATURAL_KEYS[table_name]
+    if not required:
+        return None
+    return " AND ".join(f"{quote_identifier(col)} IS NOT NULL AND {quote_identifier(col)} <> ''" for col in required)
+
+
+def natural_key_upsert_sql(table_name, columns, update_columns):
+    """
+    INSERT ... ON CONFLICT DO UPDATE sobre a chave natural da tabela (NATURAL_KEYS), com a
+    condição do índice parcial no alvo do conflito. Em conflito só update_columns são alteradas.
+    """
+    key_columns, _ = NATURAL_KEYS[table_name]
+    where = natural_key_where(table_name)
+    return (
+        f"INSERT INTO {quote_identifier(table_name)} ({', '.join(quote_identifier(c) for c in columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT ({', '.join(quote_identifier(c) for c in key_columns)})"
+        + (f" WHERE {where}" if where else "")
+        + " DO UPDATE SET " + ", ".join(f"{quote_identifier(c)} = excluded.{quote_identifier(c)}" for c in update_columns)
+    )
+
+
+def apply_natural_keys(conn):
+    """
+    Cria os índices únicos das chaves naturais (NATURAL_KEYS). Antes de criar o índice,
+    remove as linhas duplicadas da chave, mantendo a mais recente (maior rowid); as linhas
+    removidas e as chaves repetidas ficam registradas no log (WARNING).
+    """
+    tables = set(_user_tables(conn))
+    for table_name, (key_columns, _) in NATURAL_KEYS.items():
+        if table_name not in tables:
+            continue
+        if not set(key_columns) <= set(_columns(conn, table_name)):
+            continue
+        index_name = natural_key_index(table_name)
+        where = natural_key_where(table_name)
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name = ?", (index_name,)
+        ).fetchone()
+        if exists:
+            continue
+
+        table = quote_identifier(table_name)
+        cols = ", ".join(quote_identifier(col) for col in key_columns)
+        # NULL não conflita no índice único: só deduplica linhas com a chave completa
+        conditions = [f"{quote_identifier(col)} IS NOT NULL" for col in key_columns]
+        if where:
+            conditions.append(f"({where})")
+        condition = " AND ".join(conditions)
+        duplicates = conn.execute(
+            f"SELECT {cols}, COUNT(*) FROM {table} WHERE {condition} "
+            f"GROUP BY {cols} HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC LIMIT {NATURAL_KEY_LOG_SAMPLE}"
+        ).fetchall()
+        if duplicates:
+            removed = conn.execute(
+                f"DELETE FROM {table} WHERE {condition} AND rowid NOT IN "
+                f"(SELECT MAX(rowid) FROM {table} WHERE {condition} GROUP BY {cols})"
+            ).rowcount
+            logger.warning(
+                "%s: %d linha(s) removida(s) por chave natural (%s) repetida, mantida a mais recente; "
+                "chaves (até %d): %s",
+                table_name, removed, ", ".join(key_columns), NATURAL_KEY_LOG_SAMPLE,
+                "; ".join(f"{tuple(row[:-1])} x{row[-1]}" for row in duplicates),
+            )
+        conn.execute(
+            f"CREATE UNIQUE INDEX {quote_identifier(index_name)} ON {table} ({cols})"
+            + (f" WHERE {where}" if where else "")
+        )
+
+
+def _apply_versioned(conn):
+    """Executa as migrações numeradas ainda não registradas. Retorna as versões aplicadas."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    applied = {row[0] for row in conn.execute(f"SELECT version FROM {SCHEMA_VERSION_TABLE}")}
+    new_versions = []
+    for version, description, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        migration(conn)
+        conn.execute(
+            f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) VALUES (?, ?, ?)",
+            (version, description, datetime.now().isoformat(timespec='seconds')),
+        )
+        new_versions.append(version)
+    return new_versions
+
+
+def apply_migrations(conn):
+    """
+    Aplica as migrações no banco da conexão informada e faz commit. Retorna as versões
+    numeradas aplicadas agora.
+
+    Roda numa transação BEGIN IMMEDIATE, para que vários processos iniciando juntos
+    apliquem as migrações um de cada vez. A reconciliação é pulada quando o schema não
+    mudou desde a última aplicação.
+    """
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        new_versions = _apply_versioned(conn)
+        schema_cookie = conn.execute("PRAGMA schema_version").fetchone()[0]
+        reconciled_cookie = conn.execute("PRAGMA user_version").fetchone()[0]
+        if new_versions or schema_cookie != reconciled_cookie:
+            apply_required_columns(conn)
+            apply_period_columns(conn)
+            apply_change_counters(conn)
+            apply_filter_facets(conn)
+            apply_natural_keys(conn)
+            schema_cookie = conn.execute("PRAGMA schema_version").fetchone()[0]
+            conn.execute(f"PRAGMA user_version = {int(schema_cookie)}")
+        conn.commit()
+        return new_versions
+    except sqlite3.Error:
+        conn.rollback()
+        raise
@@ -0,0 +1,123 @@
+"""
+Normalização de período (mês/ano) para os filtros e para as colunas canônicas
+periodo_ano/periodo_mes.
+
+Os valores de mês chegam em vários formatos (nome em português, número, data ISO
+vinda do Excel, "Jan/26"). As expressões SQL daqui e as funções Python seguem as
+mesmas regras, para que o valor gravado pelas triggers e o valor do filtro batam.
+"""
+import re
+
+MESES = [
+    "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+    "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro",
+]
+
+# Três primeiras letras de cada mês (todas ASCII, o que permite usar LOWER() do SQLite)
+PREFIXOS_MESES = {
+    'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
+    'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12,
+}
+
+# Colunas derivadas criadas pela migração (ignoradas ao detectar as colunas de mês/ano)
+COLUNAS_PERIODO = ('periodo_ano', 'periodo_mes')
+
+_RE_ISO = re.compile(r'^(\d{4})-(\d{2})')
+_RE_MES_ANO = re.compile(r'^(\d{2})/(\d{4})$')
+_RE_ANO_FINAL = re.compile(r'/(\d{4}|\d{2})$')
+
+
+def resolver_colunas_periodo(column_names):
+    """Encontra as colunas de mês e ano de uma tabela (case-insensitive). Retorna (mes_col, ano_col)."""
+    mes_col = None
+    ano_col = None
+    for col in column_names:
+        if col in COLUNAS_PERIODO:
+            continue
+        col_lower = col.lower()
+        if not mes_col and ('mês' in col_lower or 'mes' in col_lower):
+            mes_col = col
+        if not ano_col and 'ano' in col_lower:
+            ano_col = col
+    return mes_col, ano_col
+
+
+def _mes_valido(numero):
+    return numero if 1 <= numero <= 12 else None
+
+
+def normalizar_mes(valor):
+    """Converte um valor de mês (nome, número, data ISO, "Jan/26") para 1-12, ou None."""
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return _mes_valido(int(valor))
+    texto = str(valor).strip()
+    if not texto:
+        return None
+    if texto.isdigit() and len(texto) <= 2:
+        return _mes_valido(int(texto))
+    match = _RE_ISO.match(texto)
+    if match:
+        return _mes_valido(int(match.group(2)))
+    match = _RE_MES_ANO.match(texto)
+    if match:
+        return _mes_valido(int(match.group(1)))
+    return PREFIXOS_MESES.get(texto[:3].lower())
+
+
+def normalizar_ano(valor_mes, valor_ano=None):
+    """Extrai o ano do valor de mês (data ISO, "MM/AAAA", "Jan/26") ou, se não houver, da coluna de ano."""
+    if isinstance(valor_mes, str):
+        texto = valor_mes.strip()
+        match = _RE_ISO.match(texto)
+        if match:
+            return int(match.group(1))
+        match = _RE_ANO_FINAL.search(texto)
+        if match:
+            ano = int(match.group(1))
+            return 2000 + ano if ano < 100 else ano
+    try:
+        ano = int(valor_ano)
+    except (TypeError, ValueError):
+        return None
+    return ano or None
+
+
+def sql_periodo_mes(col):
+    """Expressão SQL equivalente a normalizar_mes() para a coluna (já entre aspas) informada."""
+    texto = f"TRIM({col})"
+    prefixos = " ".join(f"WHEN '{p}' THEN {n}" for p, n in PREFIXOS_MESES.items())
+    return (
+        f"CASE "
+        f"WHEN {col} IS NULL THEN NULL "
+        f"WHEN typeof({col}) IN ('integer', 'real') THEN "
+        f"CASE WHEN CAST({col} AS INTEGER) BETWEEN 1 AND 12 THEN CAST({col} AS INTEGER) END "
+        f"WHEN {texto} GLOB '[0-9]' OR {texto} GLOB '[0-9][0-9]' THEN "
+        f"CASE WHEN CAST({texto} AS INTEGER) BETWEEN 1 AND 12 THEN CAST({texto} AS INTEGER) END "
+        f"WHEN {texto} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' THEN "
+        f"CASE WHEN CAST(substr({texto}, 6, 2) AS INTEGER) BETWEEN 1 AND 12 "
+        f"THEN CAST(substr({texto}, 6, 2) AS INTEGER) END "
+        f"WHEN {texto} GLOB '[0-9][0-9]/[0-9][0-9][0-9][0-9]' THEN "
+        f"CASE WHEN CAST(substr({texto}, 1, 2) AS INTEGER) BETWEEN 1 AND 12 "
+        f"THEN CAST(substr({texto}, 1, 2) AS INTEGER) END "
+        f"ELSE CASE LOWER(substr({texto}, 1, 3)) {prefixos} END "
+        f"END"
+    )
+
+
+def sql_periodo_ano(mes_col, ano_col=None):
+    """Expressão SQL equivalente a normalizar_ano() para as colunas (já entre aspas) informadas."""
+    texto = f"TRIM({mes_col})"
+    fallback = f"NULLIF(CAST({ano_col} AS INTEGER), 0)" if ano_col else "NULL"
+    return (
+        f"CASE "
+        f"WHEN typeof({mes_col}) = 'text' AND {texto} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' THEN "
+        f"CAST(substr({texto}, 1, 4) AS INTEGER) "
+        f"WHEN typeof({mes_col}) = 'text' AND {texto} GLOB '*/[0-9][0-9][0-9][0-9]' THEN "
+        f"CAST(substr({texto}, -4) AS INTEGER) "
+        f"WHEN typeof({mes_col}) = 'text' AND {texto} GLOB '*/[0-9][0-9]' THEN "
+        f"2000 + CAST(substr({texto}, -2) AS INTEGER) "
+        f"ELSE {fallback} "
+        f"END"
+    )
@@ -0,0 +1,70 @@
+"""
+Serialização rápida de linhas do SQLite (tuplas do cursor) para bytes JSON.
+
+Usa orjson quando estiver instalado (pip install orjson). Sem ele, usa o encoder em C
+da stdlib. Em ambos os casos cada lote de linhas é codificado numa única chamada,
+direto das tuplas do cursor, sem sqlite3.Row nem row_to_dict por linha.
+"""
+import json
+from operator import itemgetter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def _fallback_value(value):
+    """Converte tipos que o JSON não aceita (bytes e outros) para string"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    return str(value)
+
+
+_stdlib_encode = json.JSONEncoder(
+    ensure_ascii=False, check_circular=False, separators=(',', ':'), default=_fallback_value
+).encode
+
+
+def dumps(value):
+    """Serializa um valor qualquer para bytes JSON (UTF-8)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, default=_fallback_value)
+    return _stdlib_encode(value).encode('utf-8')
+
+
+class RowSerializer:
+    """
+    Serializa linhas de um cursor com colunas fixas.
+
+    columns: nomes das colunas de saída; indexes: posição de cada uma na tupla da linha
+    (permite descartar colunas repetidas do SELECT).
+    """
+
+    def __init__(self, columns, indexes=None):
+        self.columns = list(columns)
+        indexes = list(indexes) if indexes is not None else list(range(len(self.columns)))
+        if len(indexes) == 1:
+            index = indexes[0]
+            self._pick = lambda row: (row[index],)
+        else:
+            self._pick = itemgetter(*indexes)
+
+    def _dicts(self, rows):
+        columns = self.columns
+        pick = self._pick
+        return [dict(zip(columns, pick(row))) for row in rows]
+
+    def objects(self, rows):
+        """Objetos JSON {coluna: valor} das linhas, separados por vírgula (sem os colchetes)"""
+        return dumps(self._dicts(rows))[1:-1]
+
+    def arrays(self, rows):
+        """Arrays JSON [valor, ...] das linhas, separados por vírgula (sem os colchetes)"""
+        return dumps(list(map(self._pick, rows)))[1:-1]
+
+    def object_lines(self, rows):
+        """Lista com um objeto JSON (bytes) por linha, para formatos delimitados por linha"""
+        return [dumps(item) for item in self._dicts(rows)]
@@ -0,0 +1,52 @@
+"""
+Testa a extração das páginas dos PDFs (PDF/extracao_paginas.py) em sequência e em paralelo
+"""
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pdfplumber")
+
+from PDF import extracao_paginas
+from classificacao_paginas import FUNCIONARIO, OUTRA, TOTAIS, ClassificadorPaginas
+
+# Folha em que a totalização continua numa página sem os rótulos de totais (página 6)
+PDF_ADIANTAMENTO = Path(__file__).parent / "PDF" / "Folha adiantamento - 01.26.pdf"
+
+
+@pytest.mark.skipif(not PDF_ADIANTAMENTO.exists(), reason="PDF da folha de adiantamento não encontrado")
+@pytest.mark.parametrize("relevantes", [(FUNCIONARIO, OUTRA), (TOTAIS,)])
+def test_classificacao_nao_depende_dos_workers(relevantes, monkeypatch):
+    """Com um intervalo por página, o contexto da totalização precisa atravessar os intervalos"""
+    monkeypatch.setattr(extracao_paginas, "PAGINAS_POR_INTERVALO_MIN", 1)
+    sem_cache = extracao_paginas.CacheExtracao(max_bytes=0)
+    classificador = ClassificadorPaginas(*relevantes)
+
+    sequencial = extracao_paginas.extrair_paginas(PDF_ADIANTAMENTO, cache=sem_cache, workers=1,
+                                                  classificador=classificador)
+    paralelo = extracao_paginas.extrair_paginas(PDF_ADIANTAMENTO, cache=sem_cache, workers=3,
+                                                classificador=classificador)
+
+    assert [p["tipo"] for p in sequencial] == [FUNCIONARIO] * 4 + [TOTAIS] * 2
+    assert [p["tipo"] for p in paralelo] == [p["tipo"] for p in sequencial]
+    assert [p["texto"] for p in paralelo] == [p["texto"] for p in sequencial]
+    assert paralelo == sequencial
+
+
+@pytest.mark.skipif(not PDF_ADIANTAMENTO.exists(), reason="PDF da folha de adiantamento não encontrado")
+def test_so_tabelas_nao_extrai_texto(tmp_path, monkeypatch):
+    """Com texto=False as tabelas são as mesmas, sem extract_text(), e o cache não mistura as entradas"""
+    import pdfplumber.page
+
+    cache = extracao_paginas.CacheExtracao(diretorio=tmp_path)
+    completas = extracao_paginas.extrair_paginas(PDF_ADIANTAMENTO, tabelas=True, cache=cache, workers=1)
+
+    def extract_text(*args, **kwargs):
+        raise AssertionError("extract_text() chamado com texto=False")
+    monkeypatch.setattr(pdfplumber.page.Page, "extract_text", extract_text)
+    so_tabelas = extracao_paginas.extrair_paginas(PDF_ADIANTAMENTO, tabelas=True, texto=False, cache=cache,
+                                                  workers=1)
+
+    assert [p["texto"] for p in so_tabelas] == [None] * len(completas)
+    assert [p["tabelas"] for p in so_tabelas] == [p["tabelas"] for p in completas]
+    assert extracao_paginas.extrair_paginas(PDF_ADIANTAMENTO, tabelas=True, cache=cache, workers=1) == completas
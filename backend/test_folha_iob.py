@@ -0,0 +1,51 @@
+"""
+Testa o parser dos blocos de funcionário da folha IOB (folha_iob.py) com linhas no formato
+dos textos extraídos em PDF/extraidos
+"""
+import pytest
+
+from folha_iob import extrair_funcionarios
+
+CABECALHO = (
+    "Funcionário: {matricula} - FUNCIONARIO {matricula} Adm: 18/11/2025 Função: PEDREIRO\n"
+    "DEPARTAMENTO: Operacional\n"
+    "Vencimentos Referência Valor Descontos Referência Valor\n"
+    "00001 SALARIO NORMAL 31/31 2.402,05 00027 DESC. ADIANTAMENTO DE SALARIO 960,82\n"
+)
+RODAPE = "Total de Vencimentos: 2.402,05 Total de Descontos: 1.243,34 Líquido a Receber: 1.158,71\n"
+
+
+def _bloco(matricula, linha):
+    return CABECALHO.format(matricula=matricula) + linha + "\n" + RODAPE
+
+
+@pytest.mark.parametrize("linha, faltas", [
+    ("00206 FALTAS INJUSTIFICADAS 1 77,48", 1.0),
+    ("00206 FALTAS INJUSTIFICADAS 02 218,91", 2.0),
+    ("00206 FALTAS INJUSTIFICADAS 41,00 2.716,47", 41.0),
+    ("00206 FALTAS INJUSTIFICADAS 15,00 1.219,19", 15.0),
+    ("00206 FALTAS INJUSTIFICADAS 1,00 104,96", 1.0),
+    ("00151 INDENIZACAO ARTIGO 479 CLT 36,00 1.256,51 00206 FALTAS INJUSTIFICADAS 28,00 1.857,99", 28.0),
+    # Só o valor, sem referência
+    ("00206 FALTAS INJUSTIFICADAS 2.716,47", 0.0),
+    ("00206 FALTAS INJUSTIFICADAS 104,96", 0.0),
+    ("00151 INDENIZACAO ARTIGO 479 CLT 1.256,51 00206 FALTAS INJUSTIFICADAS 2.716,47", 0.0),
+])
+def test_faltas(linha, faltas):
+    (funcionario,) = extrair_funcionarios(_bloco(337, linha))
+    assert funcionario["faltas"] == faltas
+    assert funcionario["liquido"] == 1158.71
+
+
+def test_totais_da_folha_nao_entram_no_ultimo_funcionario():
+    texto = (
+        _bloco(337, "00206 FALTAS INJUSTIFICADAS 1 77,48")
+        + _bloco(338, "00080 DESCONTO INSS 7,9538% 184,89")
+        + "TOTALIZAÇÃO DA FOLHA - FUNCIONÁRIOS\n"
+        + "00151 INDENIZACAO ARTIGO 479 CLT 1.256,51 00206 FALTAS INJUSTIFICADAS 2.716,47\n"
+        + "TOTAL GERAL\n"
+        + "00151 INDENIZACAO ARTIGO 479 CLT 36,00 1.256,51 00206 FALTAS INJUSTIFICADAS 41,00 2.716,47\n"
+    )
+    funcionarios = extrair_funcionarios(texto)
+    assert [f["faltas"] for f in funcionarios] == [1.0, 0.0]
+    assert funcionarios[1]["inss"] == 184.89
@@ -0,0 +1,40 @@
+"""
+Testa a reimportação dos JSONs extraídos dos PDFs (import_pdf_jsons_to_db.py) com --no-zerar
+"""
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+import import_pdf_jsons_to_db
+
+JSON_FOLHA_MENSAL = Path(__file__).parent / "PDF" / "extraidos" / "Folha_Mensal_-_01_26.json"
+
+
+def _contar(db_file, tabela):
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0]
+
+
+@pytest.mark.skipif(not JSON_FOLHA_MENSAL.exists(), reason="JSON extraído da folha mensal não encontrado")
+def test_reimportar_sem_zerar(tmp_path, monkeypatch):
+    """Importar o mesmo período duas vezes com --no-zerar atualiza base_kpi em vez de falhar"""
+    pasta = tmp_path / "extraidos"
+    pasta.mkdir()
+    shutil.copy(JSON_FOLHA_MENSAL, pasta)
+
+    # base_kpi vem da planilha (import_excel_to_db.py); absenteísmo é criada pelas migrações
+    db_file = tmp_path / "database.db"
+    with sqlite3.connect(db_file) as conn:
+        conn.execute('CREATE TABLE base_kpi (KPI TEXT, "Mês" TEXT, Ano INTEGER, Valor REAL, Tipo TEXT)')
+    monkeypatch.setattr(import_pdf_jsons_to_db, "DB_FILE", db_file)
+    monkeypatch.setattr(sys, "argv", ["import_pdf_jsons_to_db.py", "--pasta", str(pasta), "--no-zerar"])
+
+    assert import_pdf_jsons_to_db.main() == 0
+    kpis = _contar(db_file, "base_kpi")
+    assert kpis > 0
+
+    assert import_pdf_jsons_to_db.main() == 0
+    assert _contar(db_file, "base_kpi") == kpis
@@ -0,0 +1,74 @@
+"""
+Testa a fila de jobs (jobs.py): pool de threads, JOB_MODE=worker e servidor sem threads
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobError, JobRunner
+from migrations import JOBS_TABLE, apply_migrations
+
+
+@pytest.fixture
+def connect(tmp_path):
+    db_file = tmp_path / "database.db"
+    with sqlite3.connect(db_file) as conn:
+        apply_migrations(conn)
+    local = threading.local()
+
+    def connect():
+        if getattr(local, "conn", None) is None:
+            local.conn = sqlite3.connect(db_file, timeout=10)
+        return local.conn
+    return connect
+
+
+def somar(a, b, progresso=None):
+    progresso(1, 1)
+    return {"soma": a + b}
+
+
+def _esperar(runner, job_id, timeout=5):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        job = runner.get(job_id)
+        if job["status"] in ("done", "error"):
+            return job
+        time.sleep(0.01)
+    return runner.get(job_id)
+
+
+def test_modo_thread(connect):
+    runner = JobRunner(connect, max_workers=1, mode="thread")
+    runner.register("soma", somar)
+    job = _esperar(runner, runner.submit("soma", "x.pdf", 2, 3))
+    assert job["status"] == "done"
+    assert job["resultado"] == {"soma": 5}
+    assert job["paginas_processadas"] == 1
+
+
+def test_modo_worker(connect):
+    """O app só registra o job; o job_worker.py executa a partir dos argumentos gravados"""
+    app_runner = JobRunner(connect, mode="worker")
+    app_runner.register("soma", somar)
+    job_id = app_runner.submit("soma", "x.pdf", 2, 3)
+    assert app_runner.get(job_id)["status"] == "queued"
+
+    worker = JobRunner(connect, mode="worker")
+    worker.register("soma", somar)
+    worker.run_worker(once=True)
+    job = app_runner.get(job_id)
+    assert job["status"] == "done"
+    assert job["resultado"] == {"soma": 5}
+
+
+def test_sem_threads_falha_no_submit(connect, monkeypatch):
+    monkeypatch.setattr(jobs, "threads_disponiveis", lambda: False)
+    runner = JobRunner(connect, mode="thread")
+    runner.register("soma", somar)
+    with pytest.raises(JobError):
+        runner.submit("soma", "x.pdf", 2, 3)
+    assert connect().execute(f"SELECT COUNT(*) FROM {JOBS_TABLE}").fetchone()[0] == 0
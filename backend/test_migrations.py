@@ -0,0 +1,48 @@
+"""
+Testa os índices criados pelas migrações para os filtros de período (?mes= e ?ano=)
+"""
+import sqlite3
+
+import pytest
+
+from migrations import apply_migrations
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('CREATE TABLE base_kpi (KPI TEXT, "Mês" TEXT, Ano INTEGER, Valor REAL, Tipo TEXT)')
+    conn.executemany(
+        'INSERT INTO base_kpi (KPI, "Mês", Ano, Valor, Tipo) VALUES (?, ?, ?, ?, ?)',
+        [(f"KPI {i}", mes, ano, i, "Folha") for i, (mes, ano) in enumerate(
+            (mes, ano) for ano in (2024, 2025) for mes in ("Janeiro", "Fevereiro", "Março"))],
+    )
+    apply_migrations(conn)
+    yield conn
+    conn.close()
+
+
+def _plano(conn, where):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN SELECT rowid, * FROM base_kpi WHERE {where}", (1,) * where.count("?"))
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_filtro_so_por_mes_usa_indice(conn):
+    plano = _plano(conn, "periodo_mes = ?")
+    assert "USING INDEX idx_base_kpi_periodo_mes" in plano
+    assert not plano.startswith("SCAN")
+
+
+def test_filtro_por_mes_e_ano_usa_indice(conn):
+    plano = _plano(conn, "periodo_mes = ? AND periodo_ano = ?")
+    assert "USING INDEX idx_base_kpi_periodo" in plano
+
+
+def test_banco_existente_recebe_indice_por_mes(conn):
+    """Bancos já reconciliados antes do índice por mês o recebem pela migração numerada"""
+    conn.execute("DROP INDEX idx_base_kpi_periodo_mes")
+    conn.execute("DELETE FROM schema_version WHERE version = 3")
+    conn.execute(f"PRAGMA user_version = {conn.execute('PRAGMA schema_version').fetchone()[0]}")
+    conn.commit()
+    apply_migrations(conn)
+    assert "USING INDEX idx_base_kpi_periodo_mes" in _plano(conn, "periodo_mes = ?")